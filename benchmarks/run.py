@@ -0,0 +1,467 @@
+"""In-process endpoint benchmarks.
+
+Seeds a database with `benchmarks.seed`, drives every route of the app
+through Starlette's TestClient and reports per endpoint: p50/p99 latency,
+throughput, peak allocated memory per request (tracemalloc) and SQL
+statements per request. External services are replaced with local stand-ins:
+OpenAI with a canned plan, Google with locally generated signing keys, and
+SMTP delivery is not started.
+
+    python -m benchmarks.run --scale small
+    python -m benchmarks.run --scale medium --save benchmarks/baselines/medium.json
+    python -m benchmarks.run --scale medium --compare benchmarks/baselines/medium.json
+    python -m benchmarks.run --scale large --database-url postgresql://localhost/bench_scratch
+
+Without --database-url a fresh SQLite file is created in a temp directory.
+A Postgres URL must point at a throwaway database; it is migrated and seeded
+but never cleaned up. Cold start is measured separately by
+`python -m benchmarks.startup`.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+
+def configure_environment(database_url: str):
+    # Must run before any app module is imported: database.py reads the URL at import.
+    os.environ["SUPABASE_DATABASE_URL"] = database_url
+    os.environ.setdefault("my_api_key", "benchmark")
+    os.environ.setdefault("client_id", "benchmark-client")
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class StubOpenAI:
+    """Stands in for the OpenAI client and returns a fixed-size plan."""
+
+    def __init__(self, tasks: int = 20):
+        self.tasks = tasks
+        self.chat = self
+        self.completions = self
+
+    def create(self, model, messages, **kwargs):
+        from types import SimpleNamespace
+
+        plan = [
+            {
+                "id": f"model-{i}",
+                "name": f"Generated task {i}",
+                "tag": {"id": f"model-tag-{i % 4}", "name": f"Area {i % 4}", "color": "bg-slate-400"},
+                "description": "Generated by the benchmark stub.",
+                "finished": False,
+                "date": f"2024-05-{1 + i % 28:02d}T00:00:00",
+            }
+            for i in range(self.tasks)
+        ]
+        content = json.dumps(plan)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class StubGoogle:
+    """Local RSA key + certificate endpoint stand-in for Google sign-in."""
+
+    def __init__(self, audience: str):
+        from cryptography import x509
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.x509.oid import NameOID
+        from google.auth import crypt
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "benchmark")])
+        cert = (
+            x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(1).not_valid_before(datetime(2020, 1, 1)).not_valid_after(datetime(2100, 1, 1))
+            .sign(key, hashes.SHA256())
+        )
+        self.audience = audience
+        self.certs = {"bench": cert.public_bytes(serialization.Encoding.PEM).decode()}
+        private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+        self.signer = crypt.RSASigner.from_string(private_pem.decode(), key_id="bench")
+        self.headers = {"Cache-Control": "public, max-age=3600"}
+
+    # requests.Session / Response protocol used by GoogleTokenVerifier
+    def get(self, url, timeout=None):
+        return self
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.certs
+
+    def token(self, email: str):
+        from google.auth import jwt
+
+        now = int(time.time())
+        payload = {
+            "iss": "https://accounts.google.com", "aud": self.audience, "iat": now, "exp": now + 3600,
+            "email": email, "name": email.split("@")[0], "picture": "",
+        }
+        return jwt.encode(self.signer, payload).decode()
+
+
+class Case:
+    def __init__(self, name, method, path, body=None, headers=None, setup=None, after=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.headers = headers
+        self.setup = setup
+        self.after = after
+
+    def request(self, ctx, i):
+        path = self.path(ctx, i) if callable(self.path) else self.path
+        kwargs = {"headers": {**ctx.auth, **(self.headers(ctx, i) if self.headers else {})}}
+        if self.body is not None:
+            kwargs["json"] = self.body(ctx, i) if callable(self.body) else self.body
+        return path, kwargs
+
+
+class Context:
+    def __init__(self, client, data, stub_google):
+        self.client = client
+        self.data = data
+        self.google = stub_google
+        self.project_id = data["project_ids"][0]
+        self.task_id = data["task_ids"][0]
+        self.tag_id = data["tags_by_project"][self.project_id][0]
+        self.targets = {}
+        self.auth = {}
+
+    def login(self):
+        response = self.client.post("/login/normal", json={"email": self.data["email"], "password": self.data["password"]})
+        self.auth = {"Authorization": f"Bearer {response.json()['auth_token']}"}
+
+
+def make_plan_tasks(db, project_id, user_id, count):
+    import schemas
+    from crud import bulk_create_plan
+
+    plan = schemas.GeneratedPlan(tasks=[{"name": f"Disposable {i}", "date": "2024-06-01T00:00:00"} for i in range(count)])
+    task_ids, _ = bulk_create_plan(project_id, user_id, plan, db)
+    return task_ids
+
+
+def setup_disposable_tasks(ctx, n):
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        ctx.targets["delete_task"] = make_plan_tasks(db, ctx.project_id, ctx.data["user_id"], n)
+    finally:
+        db.close()
+
+
+def setup_bulk_tasks(ctx, n):
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        ctx.targets["bulk"] = make_plan_tasks(db, ctx.project_id, ctx.data["user_id"], 50)
+    finally:
+        db.close()
+
+
+def bulk_operations(ctx, i):
+    # 100 operations: a milestone close-out (same value) and a reschedule (distinct values).
+    task_ids = ctx.targets["bulk"]
+    finish = [{"op": "finish", "task_id": task_id, "finished": bool(i % 2)} for task_id in task_ids]
+    reschedule = [{"op": "update", "task_id": task_id, "date": f"2024-07-{n % 28 + 1:02d}T00:00:00"} for n, task_id in enumerate(task_ids)]
+    return {"operations": finish + reschedule}
+
+
+def setup_disposable_projects(ctx, n):
+    from database import SessionLocal
+    from models import Project
+
+    db = SessionLocal()
+    try:
+        project_ids = []
+        for i in range(n):
+            project = Project(name=f"Disposable project {i}", priority="low", owner_id=ctx.data["user_id"])
+            db.add(project)
+            db.commit()
+            make_plan_tasks(db, project.id, ctx.data["user_id"], 10)
+            project_ids.append(project.id)
+        ctx.targets["delete_project"] = project_ids
+    finally:
+        db.close()
+
+
+def setup_email(ctx, n):
+    response = ctx.client.post("/send_email", headers=ctx.auth, json={"subject": "s", "message": "m", "sender": "bench@example.com", "receiver": "to@example.com"})
+    ctx.targets["email"] = response.json()["id"]
+
+
+def setup_job(ctx, n):
+    response = ctx.client.post("/create_project/ai", headers=ctx.auth, json={"name": "AI", "priority": "high", "description": "bench"})
+    ctx.targets["job"] = response.json()["id"]
+
+
+def setup_etag(ctx, n):
+    ctx.targets["etag"] = ctx.client.get("/get_projects", headers=ctx.auth).headers.get("etag", "")
+
+
+def setup_google_tokens(ctx, n):
+    ctx.targets["google"] = [ctx.google.token(f"google-{i}-{time.time_ns()}@example.com") for i in range(n)]
+
+
+def wait_for_jobs(ctx):
+    from jobs import job_queue
+
+    deadline = time.monotonic() + 60
+    while job_queue._active and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def build_cases():
+    run_id = time.time_ns()
+    return [
+        # routes/users.py
+        Case("POST /signup/normal", "post", "/signup/normal",
+             body=lambda ctx, i: {"name": f"signup-{run_id}-{i}", "email": f"signup-{run_id}-{i}@example.com", "password": "pw"}),
+        Case("POST /signup/google", "post", "/signup/google",
+             body=lambda ctx, i: {"token": ctx.targets["google"][i]}, setup=setup_google_tokens),
+        Case("POST /login/normal", "post", "/login/normal",
+             body=lambda ctx, i: {"email": ctx.data["email"], "password": ctx.data["password"]}),
+        Case("GET /users", "get", "/users"),
+        Case("GET /users?limit=50", "get", "/users?limit=50"),
+        Case("GET /users?stream=true", "get", "/users?stream=true"),
+        Case("GET /user_details", "get", "/user_details"),
+        Case("PUT /users/{user_id}", "put", lambda ctx, i: f"/users/{ctx.data['user_id']}",
+             body=lambda ctx, i: {"gender": "f" if i % 2 else "m"}),
+        Case("POST /send_email", "post", "/send_email",
+             body={"subject": "Benchmark", "message": "Hello", "sender": "bench@example.com", "receiver": "to@example.com"}),
+        Case("GET /emails/{email_id}", "get", lambda ctx, i: f"/emails/{ctx.targets['email']}", setup=setup_email),
+        # routes/projects.py
+        Case("GET /get_projects", "get", "/get_projects"),
+        Case("GET /dashboard", "get", "/dashboard"),
+        Case("GET /get_projects?limit=10", "get", "/get_projects?limit=10"),
+        Case("GET /get_projects (304)", "get", "/get_projects",
+             headers=lambda ctx, i: {"If-None-Match": ctx.targets["etag"]}, setup=setup_etag),
+        Case("GET /get_project/{project_id}", "get", lambda ctx, i: f"/get_project/{ctx.project_id}"),
+        Case("POST /create_project", "post", "/create_project",
+             body=lambda ctx, i: {"name": f"Bench project {i}", "priority": "low"}),
+        Case("POST /create_project/ai", "post", "/create_project/ai",
+             body={"name": "AI project", "priority": "high", "description": "benchmark"}, after=wait_for_jobs),
+        Case("GET /jobs/{job_id}", "get", lambda ctx, i: f"/jobs/{ctx.targets['job']}", setup=setup_job, after=wait_for_jobs),
+        Case("DELETE /delete_project/{project_id}", "delete",
+             lambda ctx, i: f"/delete_project/{ctx.targets['delete_project'][i]}", setup=setup_disposable_projects),
+        # routes/tasks.py
+        Case("GET /get_tasks/{project_id}", "get", lambda ctx, i: f"/get_tasks/{ctx.project_id}"),
+        Case("GET /get_tasks/{project_id}?limit=50", "get", lambda ctx, i: f"/get_tasks/{ctx.project_id}?limit=50"),
+        Case("GET /search_tasks/{project_id}?q=synthetic", "get", lambda ctx, i: f"/search_tasks/{ctx.project_id}?q=synthetic&limit=50"),
+        Case("GET /search_tasks/{project_id}?q=task+7", "get", lambda ctx, i: f"/search_tasks/{ctx.project_id}?q=task+7&limit=50"),
+        Case("GET /search_tasks/{project_id}?finished=true", "get", lambda ctx, i: f"/search_tasks/{ctx.project_id}?finished=true&limit=50"),
+        Case("GET /assigned_tasks", "get", "/assigned_tasks"),
+        Case("GET /assigned_tasks?limit=50", "get", "/assigned_tasks?limit=50"),
+        Case("GET /calendar", "get", "/calendar?start=2024-03-01T00:00:00&end=2024-04-01T00:00:00"),
+        Case("POST /create_task/{project_id}", "post", lambda ctx, i: f"/create_task/{ctx.project_id}",
+             body=lambda ctx, i: {"name": f"Bench task {i}", "tag_name": "bench", "tag_color": "bg-red-400"}),
+        Case("POST /create_task/{project_id}?mode=minimal", "post", lambda ctx, i: f"/create_task/{ctx.project_id}?mode=minimal",
+             body=lambda ctx, i: {"name": f"Bench task {i}", "tag_name": "bench", "tag_color": "bg-red-400"}),
+        Case("PUT /edit_task/{task_id}", "put", lambda ctx, i: f"/edit_task/{ctx.task_id}",
+             body=lambda ctx, i: {"name": f"Edited {i}", "finished": bool(i % 2)}),
+        Case("PUT /edit_task/{task_id}?mode=minimal", "put", lambda ctx, i: f"/edit_task/{ctx.task_id}?mode=minimal",
+             body=lambda ctx, i: {"name": f"Edited {i}", "finished": bool(i % 2)}),
+        Case("POST /add_task_tag/{task_id}/{tag_id}", "post", lambda ctx, i: f"/add_task_tag/{ctx.task_id}/{ctx.tag_id}"),
+        Case("GET /get_tags/{project_id}", "get", lambda ctx, i: f"/get_tags/{ctx.project_id}"),
+        Case("POST /create_tag/{task_id}", "post", lambda ctx, i: f"/create_tag/{ctx.task_id}",
+             body=lambda ctx, i: {"name": f"tag {i}", "color": "bg-green-400"}),
+        Case("POST /bulk_tasks/{project_id} (100 ops)", "post", lambda ctx, i: f"/bulk_tasks/{ctx.project_id}",
+             body=bulk_operations, setup=setup_bulk_tasks),
+        Case("DELETE /delete_task/{task_id}", "delete",
+             lambda ctx, i: f"/delete_task/{ctx.targets['delete_task'][i]}", setup=setup_disposable_tasks),
+        Case("DELETE /delete_task/{task_id}?mode=minimal", "delete",
+             lambda ctx, i: f"/delete_task/{ctx.targets['delete_task'][i]}?mode=minimal", setup=setup_disposable_tasks),
+    ]
+
+
+def run_case(ctx, case, counter, warmup, iterations, memory_iterations):
+    total = warmup + iterations + memory_iterations
+    if case.setup:
+        case.setup(ctx, total)
+    send = getattr(ctx.client, case.method)
+
+    def call(i):
+        path, kwargs = case.request(ctx, i)
+        response = send(path, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{case.name} returned {response.status_code}: {response.text[:200]}")
+        return response
+
+    for i in range(warmup):
+        call(i)
+
+    latencies = []
+    statements = []
+    started = time.perf_counter()
+    for i in range(warmup, warmup + iterations):
+        counter[0] = 0
+        t0 = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - t0)
+        statements.append(counter[0])
+    elapsed = time.perf_counter() - started
+
+    peaks = []
+    tracemalloc.start()
+    for i in range(warmup + iterations, total):
+        tracemalloc.reset_peak()
+        call(i)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    if case.after:
+        case.after(ctx)
+
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "throughput_rps": round(iterations / elapsed, 2),
+        "peak_alloc_kb": round(max(peaks) / 1024, 1) if peaks else None,
+        "sql_statements": round(sum(statements) / len(statements), 2),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print per-endpoint deltas against a baseline; return the regressed endpoint names."""
+    regressions = []
+    print(f"\n{'endpoint':<44} {'p50 ms':>18} {'p99 ms':>18} {'sql':>12}")
+    for name, current in results["endpoints"].items():
+        base = baseline["endpoints"].get(name)
+        if not base:
+            print(f"{name:<44} (new)")
+            continue
+        p50_ratio = current["p50_ms"] / base["p50_ms"] if base["p50_ms"] else 1
+        regressed = p50_ratio > 1 + threshold or current["sql_statements"] > base["sql_statements"]
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<44} {base['p50_ms']:>7}->{current['p50_ms']:<8} {base['p99_ms']:>7}->{current['p99_ms']:<8}"
+            f" {base['sql_statements']:>5}->{current['sql_statements']:<5}{'  REGRESSED' if regressed else ''}"
+        )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=["small", "medium", "large"], default="small")
+    parser.add_argument("--users", type=int, help="override the scale's user count")
+    parser.add_argument("--projects", type=int, help="override the scale's project count")
+    parser.add_argument("--tasks", type=int, help="override the scale's total task count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--memory-iterations", type=int, default=3)
+    parser.add_argument("--only", action="append", default=[], help="run endpoints whose name contains this text")
+    parser.add_argument("--save", help="write results as a JSON baseline to this path")
+    parser.add_argument("--compare", help="compare against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown before flagging, as a fraction")
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.db')}"
+    configure_environment(database_url)
+
+    import sqlalchemy
+    from sqlalchemy import event
+    from fastapi.testclient import TestClient
+    import database
+    import google_verify
+    import migrate
+    import outbox
+    import routes.projects
+    import project_stats
+    from benchmarks.seed import SCALES, generate
+    from web import web_app
+
+    migrate.upgrade(database.engine)
+
+    scale = dict(SCALES[args.scale])
+    for key in ("users", "projects", "tasks"):
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+    started = time.perf_counter()
+    data = generate(database.engine, seed=args.seed, **scale)
+    # The seed writes rows directly, so derive the aggregates the routes maintain.
+    with database.SessionLocal() as db:
+        project_stats.rebuild(db)
+    print(f"Seeded {scale} in {time.perf_counter() - started:.1f}s into {database.engine.url.render_as_string(hide_password=True)}")
+
+    stub_google = StubGoogle(audience=os.environ["client_id"])
+    google_verify.google_verifier = google_verify.GoogleTokenVerifier(
+        audience=stub_google.audience, session=stub_google, refresh_in_background=False
+    )
+    routes.projects.client = StubOpenAI()
+    outbox.email_sender.notify = lambda: None
+
+    counter = [0]
+
+    def count_statement(*args):
+        counter[0] += 1
+
+    database.get_async_sessionmaker()
+    for engine in (database.engine, database.async_engine.sync_engine):
+        event.listen(engine, "before_cursor_execute", count_statement)
+
+    client = TestClient(web_app)
+    ctx = Context(client, data, stub_google)
+    ctx.login()
+
+    results = {
+        "meta": {
+            "scale": args.scale,
+            "dataset": scale,
+            "seed": args.seed,
+            "iterations": args.iterations,
+            "dialect": database.engine.dialect.name,
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "created_at": datetime.utcnow().isoformat(),
+        },
+        "endpoints": {},
+    }
+
+    for case in build_cases():
+        if args.only and not any(text in case.name for text in args.only):
+            continue
+        result = run_case(ctx, case, counter, args.warmup, args.iterations, args.memory_iterations)
+        results["endpoints"][case.name] = result
+        print(
+            f"{case.name:<44} p50 {result['p50_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms  "
+            f"{result['throughput_rps']:>8.1f} req/s  {result['peak_alloc_kb'] or 0:>9.1f} KiB  {result['sql_statements']:>6} sql"
+        )
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} endpoint(s) regressed beyond {args.threshold:.0%} or issued more SQL.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Seeded synthetic data generator for benchmarks.
+
+Everything is derived from `seed`, so two runs at the same scale produce the
+same ids, names, dates and assignments and their numbers are comparable.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from models import User, Project, Tag, Task, user_tasks, user_projects
+from passwords import pwd_context
+
+# Named scales; `tasks` is the total across all projects.
+SCALES = {
+    "small": {"users": 5, "projects": 2, "tasks": 10, "tags_per_project": 3, "assignees_per_task": 1},
+    "medium": {"users": 50, "projects": 10, "tasks": 1_000, "tags_per_project": 5, "assignees_per_task": 2},
+    "large": {"users": 500, "projects": 100, "tasks": 100_000, "tags_per_project": 8, "assignees_per_task": 2},
+}
+
+BENCH_PASSWORD = "benchmark-password"
+TAG_COLORS = ["bg-slate-400", "bg-red-400", "bg-orange-400", "bg-green-400", "bg-sky-400", "bg-violet-400"]
+CHUNK_SIZE = 5_000
+
+
+def _insert(conn, table, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        conn.execute(insert(table), rows[start:start + CHUNK_SIZE])
+
+
+def generate(engine, users, projects, tasks, tags_per_project, assignees_per_task, seed=0):
+    """Insert a synthetic dataset and return the ids the benchmark needs.
+
+    User 0 is the benchmark principal: it owns every project and is assigned
+    to all of them, so its /get_projects response spans the whole dataset.
+    """
+    rng = random.Random(seed)
+
+    def new_id():
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    base_date = datetime(2024, 1, 1)
+    hashed_password = pwd_context.hash(BENCH_PASSWORD)
+
+    user_rows = [
+        {
+            'id': new_id(),
+            'name': f"bench-user-{seed}-{i}",
+            'email': f"bench-{seed}-{i}@example.com",
+            'hashed_password': hashed_password,
+            'auth_type': "normal",
+            'gender': "",
+            'picture': ""
+        }
+        for i in range(users)
+    ]
+    principal = user_rows[0]
+
+    project_rows = []
+    tag_rows = []
+    task_rows = []
+    user_project_rows = []
+    user_task_rows = []
+    tags_by_project = {}
+
+    for p in range(projects):
+        project_id = new_id()
+        start = base_date + timedelta(days=rng.randrange(365))
+        project_rows.append({
+            'id': project_id,
+            'name': f"Project {p}",
+            'description': f"Synthetic project {p}",
+            'finished': False,
+            'priority': rng.choice(["low", "medium", "high"]),
+            'date_start': start,
+            'date_end': start + timedelta(days=90),
+            'owner_id': principal['id']
+        })
+        members = {principal['id']} | {rng.choice(user_rows)['id'] for _ in range(min(users, 3))}
+        user_project_rows.extend({'user_id': user_id, 'project_id': project_id} for user_id in members)
+
+        tags_by_project[project_id] = []
+        for t in range(tags_per_project):
+            tag_id = new_id()
+            tags_by_project[project_id].append(tag_id)
+            tag_rows.append({'id': tag_id, 'name': f"tag-{t}", 'color': rng.choice(TAG_COLORS), 'project_id': project_id})
+
+    for i in range(tasks):
+        project = project_rows[i % projects]
+        task_id = new_id()
+        task_rows.append({
+            'id': task_id,
+            'name': f"Task {i}",
+            'description': f"Synthetic task {i} for {project['name']}",
+            'finished': rng.random() < 0.3,
+            'date': project['date_start'] + timedelta(days=rng.randrange(90), hours=rng.randrange(24)),
+            'project_id': project['id'],
+            'tag_id': rng.choice(tags_by_project[project['id']]) if tags_by_project[project['id']] else None
+        })
+        assignees = {principal['id']} if i % 2 == 0 else set()
+        while len(assignees) < min(assignees_per_task, users):
+            assignees.add(rng.choice(user_rows)['id'])
+        user_task_rows.extend({'user_id': user_id, 'task_id': task_id} for user_id in assignees)
+
+    with engine.begin() as conn:
+        _insert(conn, User.__table__, user_rows)
+        _insert(conn, Project.__table__, project_rows)
+        _insert(conn, Tag.__table__, tag_rows)
+        _insert(conn, Task.__table__, task_rows)
+        _insert(conn, user_projects, user_project_rows)
+        _insert(conn, user_tasks, user_task_rows)
+
+    return {
+        'user_id': principal['id'],
+        'email': principal['email'],
+        'password': BENCH_PASSWORD,
+        'user_ids': [row['id'] for row in user_rows],
+        'project_ids': [row['id'] for row in project_rows],
+        'task_ids': [row['id'] for row in task_rows],
+        'tags_by_project': tags_by_project,
+    }
@@ -0,0 +1,121 @@
+"""Cold-start profile: how long a fresh container takes to serve its first request.
+
+Each run starts a new interpreter, as Modal does for a new container, which
+imports `web`, builds the app and serves one request in-process through the
+ASGI interface. The report shows, as medians over the runs, the interpreter
+start, the app import, the first request, and the total wall time from
+process start to the first response. It also lists the packages that took
+longest to import, from `python -X importtime`.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --top 25
+    python -m benchmarks.startup --budget 1.5    # exit 1 when the median total is over 1.5s
+
+The default request, GET /metrics, touches no database, so the numbers show
+the app's own startup cost and not the latency to a database. Without
+--database-url the app is pointed at a SQLite file in a temp directory; the
+engine does not connect until a request needs it.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.run import configure_environment
+
+PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+from web import web_app
+imported = time.perf_counter()
+
+async def first_request(path):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"startup")], "client": ("127.0.0.1", 0), "server": ("startup", 80),
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await web_app(scope, receive, send)
+    return status[0]
+
+status = asyncio.run(first_request(sys.argv[1]))
+served = time.perf_counter()
+print(json.dumps({"import": imported - started, "first_request": served - imported, "status": status}))
+"""
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run_probe(path: str, importtime=False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE, path]
+    started = time.perf_counter()
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=os.getcwd())
+    total = time.perf_counter() - started
+    if completed.returncode != 0:
+        sys.exit(f"Startup probe failed:\n{completed.stderr}")
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    timings["total"] = total
+    timings["interpreter"] = total - timings["import"] - timings["first_request"]
+    return timings, completed.stderr
+
+
+def slowest_imports(importtime_output: str, top: int):
+    """Cumulative import time per top-level package, slowest first, in seconds."""
+    packages = {}
+    for line in importtime_output.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            name = match.group(4).split(".")[0]
+            packages[name] = max(packages.get(name, 0), int(match.group(2)) / 1e6)
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/metrics", help="path of the first request")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest packages to list")
+    parser.add_argument("--database-url", help="defaults to a SQLite file in a temp directory")
+    parser.add_argument("--budget", type=float, help="fail when the median total startup exceeds this many seconds")
+    args = parser.parse_args(argv)
+
+    configure_environment(args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='startup-'), 'startup.db')}")
+
+    runs = [run_probe(args.path)[0] for _ in range(args.runs)]
+    median = {key: statistics.median(run[key] for run in runs) for key in ("interpreter", "import", "first_request", "total")}
+    status = runs[-1]["status"]
+
+    print(f"Cold start over {args.runs} run(s), GET {args.path} -> {status}")
+    for key in ("interpreter", "import", "first_request", "total"):
+        print(f"  {key:<14} {median[key] * 1000:>9.1f} ms  (min {min(run[key] for run in runs) * 1000:.1f}, max {max(run[key] for run in runs) * 1000:.1f})")
+
+    _, importtime_output = run_probe(args.path, importtime=True)
+    print("\nSlowest imports (cumulative, one -X importtime run)")
+    for name, seconds in slowest_imports(importtime_output, args.top):
+        print(f"  {name:<30} {seconds * 1000:>9.1f} ms")
+
+    if status >= 500:
+        print(f"\nThe first request failed with {status}.")
+        return 1
+    if args.budget is not None and median["total"] > args.budget:
+        print(f"\nMedian startup {median['total']:.2f}s is over the {args.budget:.2f}s budget.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict, deque
+
+CHANGEFEED_HISTORY = int(os.getenv("CHANGEFEED_HISTORY", "256"))
+CHANGEFEED_QUEUE_SIZE = int(os.getenv("CHANGEFEED_QUEUE_SIZE", "64"))
+CHANGEFEED_MAX_PROJECTS = int(os.getenv("CHANGEFEED_MAX_PROJECTS", "1024"))
+CHANGEFEED_HEARTBEAT = float(os.getenv("CHANGEFEED_HEARTBEAT", "15"))
+
+
+def make_event(kind: str, project_id: str, version, data=None):
+    return {"type": kind, "project_id": project_id, "version": version, "data": data or {}}
+
+
+def is_final(event):
+    """A subscription ends after its project is deleted or after it overflowed."""
+    return event["type"] == "project.deleted" or (event["type"] == "resync" and event["data"].get("reason") == "overflow")
+
+
+class Subscription:
+    """One client's feed for one project, consumed on the event loop that opened it.
+
+    Events published by request threads are handed to the loop with
+    `call_soon_threadsafe` and kept in a bounded queue. A client that lets the
+    queue fill up is sent a `resync` event and disconnected instead of holding
+    memory or slowing down writers; it reconnects with the last version it saw.
+    """
+
+    def __init__(self, hub, project_id: str, version: int, backlog, queue_size: int):
+        self.hub = hub
+        self.project_id = project_id
+        self.version = version
+        self.backlog = deque(backlog)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def notify(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._deliver, event)
+        except RuntimeError:
+            # The loop is gone; the client went away with it.
+            self.hub.unsubscribe(self)
+
+    def _deliver(self, event):
+        if self.overflowed:
+            return
+        if self.queue.full():
+            self.overflowed = True
+            self.hub.record_overflow(self)
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = make_event("resync", self.project_id, event["version"], {"reason": "overflow"})
+        self.queue.put_nowait(event)
+
+    async def _next(self, heartbeat: float):
+        if self.backlog:
+            return self.backlog.popleft()
+        try:
+            return await asyncio.wait_for(self.queue.get(), heartbeat)
+        except asyncio.TimeoutError:
+            return None
+
+    async def events(self, heartbeat: float = CHANGEFEED_HEARTBEAT):
+        """Yield events in version order, and None as a heartbeat while idle.
+
+        A version gap means a change was committed that this process did not
+        publish (another container, or history that was evicted), so a
+        `resync` is sent in place of the events that cannot be replayed.
+        """
+        try:
+            while True:
+                event = await self._next(heartbeat)
+                if event is None:
+                    yield None
+                    continue
+                if event["type"] != "resync" and event["version"] <= self.version:
+                    continue
+                if event["type"] != "resync" and event["version"] > self.version + 1:
+                    event = make_event("resync", self.project_id, event["version"], {"reason": "gap"})
+                self.version = max(self.version, event["version"])
+                yield event
+                if is_final(event):
+                    return
+        finally:
+            self.hub.unsubscribe(self)
+
+
+class ChangeHub:
+    """In-process fan-out of committed project changes.
+
+    Every mutation bumps `Project.version` and publishes an event carrying the
+    new version. The last `history` events per project are kept so a client
+    reconnecting with `since=<version>` is replayed only what it missed. When
+    the history cannot cover that range the client gets a `resync`, should
+    refetch the project, and keeps receiving events from there.
+    """
+
+    def __init__(self, history=CHANGEFEED_HISTORY, queue_size=CHANGEFEED_QUEUE_SIZE, max_projects=CHANGEFEED_MAX_PROJECTS):
+        self.history = history
+        self.queue_size = queue_size
+        self.max_projects = max_projects
+        self._events = OrderedDict()
+        self._subscribers = {}
+        self._lock = threading.RLock()
+        self._stats = {"published": 0, "overflows": 0, "resumed": 0, "resyncs": 0}
+
+    def publish(self, project_id: str, version, kind: str, data=None):
+        """Record a committed change; call after the commit. No-op without a version."""
+        if project_id is None or version is None:
+            return None
+        event = make_event(kind, project_id, version, data)
+        with self._lock:
+            events = self._events.get(project_id)
+            if events is None:
+                events = self._events[project_id] = deque(maxlen=self.history)
+                while len(self._events) > self.max_projects:
+                    self._events.popitem(last=False)
+            else:
+                self._events.move_to_end(project_id)
+            events.append(event)
+            self._stats["published"] += 1
+            # Notifying under the lock keeps per-project delivery in publish order.
+            for subscription in list(self._subscribers.get(project_id, ())):
+                subscription.notify(event)
+        return event
+
+    def subscribe(self, project_id: str, current_version: int, since: int = None):
+        """Open a subscription on the running event loop.
+
+        `current_version` is the project's version read from the database;
+        `since` is the last version the client has applied, if any.
+        """
+        with self._lock:
+            backlog = []
+            if since is not None and since < current_version:
+                backlog = [event for event in self._events.get(project_id, ()) if event["version"] > since]
+                versions = [event["version"] for event in backlog]
+                complete = bool(versions) and versions == list(range(since + 1, since + 1 + len(versions))) and versions[-1] >= current_version
+                if complete:
+                    self._stats["resumed"] += 1
+                else:
+                    backlog = [make_event("resync", project_id, current_version, {"reason": "history"})]
+                    self._stats["resyncs"] += 1
+            start = since if backlog and backlog[0]["type"] != "resync" else current_version
+            subscription = Subscription(self, project_id, start, backlog, self.queue_size)
+            self._subscribers.setdefault(project_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.project_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.project_id]
+
+    def record_overflow(self, subscription: Subscription):
+        with self._lock:
+            self._stats["overflows"] += 1
+        self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, subscribers=sum(len(s) for s in self._subscribers.values()), projects=len(self._events))
+
+
+change_hub = ChangeHub()
@@ -0,0 +1,30 @@
+import hashlib
+from typing import Optional
+from fastapi import Request, Response
+
+# Part of every tag so a change to the response shape invalidates old ETags.
+RESPONSE_SCHEMA_VERSION = "1"
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1("\x1f".join(str(part) for part in (RESPONSE_SCHEMA_VERSION, *parts)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def matches(request: Request, etag: str):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/"x" matches "x".
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in candidates
+
+
+def conditional(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Return a 304 response if the client already has `etag`, else tag `response` with it."""
+    if matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
@@ -1,7 +1,75 @@
-from sqlalchemy.orm import Session
-from models import User, Project, Tag, Task
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import and_, case, delete, insert, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from models import User, Project, Tag, Task, user_tasks, user_projects
 from uuid import uuid4
 import schemas
+from pagination import PageParams, paginate
+from project_stats import StatsDelta
+
+# Eager-load options for a whole project tree. Each collection is fetched with
+# one batched SELECT ... IN (...) so the number of queries stays fixed no matter
+# how many projects or tasks are loaded.
+TASK_TREE_OPTIONS = (
+    joinedload(Task.tag),
+    selectinload(Task.assignees),
+)
+
+PROJECT_TREE_OPTIONS = (
+    joinedload(Project.owner),
+    selectinload(Project.assignees),
+    selectinload(Project.tags),
+    selectinload(Project.tasks).joinedload(Task.tag),
+    selectinload(Project.tasks).selectinload(Task.assignees),
+)
+
+def task_tree_query(db: Session, *criteria):
+    return db.query(Task).options(*TASK_TREE_OPTIONS).filter(*criteria)
+
+def project_tree_query(db: Session, *criteria):
+    return db.query(Project).options(*PROJECT_TREE_OPTIONS).filter(*criteria)
+
+def load_tasks(db: Session, *criteria):
+    return task_tree_query(db, *criteria).all()
+
+def load_project_tree(db: Session, *criteria):
+    return project_tree_query(db, *criteria).all()
+
+def bump_project_version(project_id: str, db: Session):
+    """Mark a project's tree as changed; call before committing the mutation. Returns the new version."""
+    return db.execute(
+        update(Project).where(Project.id == project_id).values(version=Project.version + 1).returning(Project.version)
+    ).scalar()
+
+def bump_user_project_versions(user_id: str, db: Session):
+    """Mark every project that shows `user_id`'s name as changed: owned, assigned, or holding a task assigned to them.
+
+    Call before committing the rename. Returns `(project_id, version)` rows.
+    """
+    assigned_projects = select(user_projects.c.project_id).where(user_projects.c.user_id == user_id)
+    task_projects = select(Task.project_id).join(user_tasks, user_tasks.c.task_id == Task.id).where(user_tasks.c.user_id == user_id)
+    return db.execute(
+        update(Project)
+        .where(or_(Project.owner_id == user_id, Project.id.in_(assigned_projects), Project.id.in_(task_projects)))
+        .values(version=Project.version + 1)
+        .returning(Project.id, Project.version)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+def delete_task_row(task_id: str, db: Session):
+    """Delete a task in one statement; its assignments go with it through ON DELETE CASCADE.
+
+    Returns a `(project_id, tag_id, finished)` row, or None when there was no such task.
+    """
+    return db.execute(delete(Task).where(Task.id == task_id).returning(Task.project_id, Task.tag_id, Task.finished)).first()
+
+def get_project_version(project_id: str, db: Session):
+    return db.query(Project.version).filter(Project.id == project_id).scalar()
+
+def get_project_versions(owner_id: str, db: Session):
+    return db.query(Project.id, Project.version).filter(Project.owner_id == owner_id).order_by(Project.id).all()
 
 def get_tags(project_id: str, db: Session):
     return db.query(Tag).filter(Tag.project_id == project_id).all()
@@ -9,60 +77,215 @@ def get_tags(project_id: str, db: Session):
 def create_tag(project_id: str, tag_name: str, tag_color: str, db: Session):
     tag_id = str(uuid4())
     tag_model = Tag(id=tag_id, name=tag_name, color=tag_color, project_id=project_id)
-    db.add(tag_model)
-    db.commit()
+    db.add(tag_model)  # committed with the caller's transaction
     return tag_id
 
-def organize_task(task_id: str, db: Session):
-    task = db.query(Task).filter(Task.id == task_id).first()
-    tag = task.tag 
-    assignees = task.assignees
-    task_data = {
+def bulk_create_plan(project_id: str, assignee_id: str, plan: schemas.GeneratedPlan, db: Session):
+    """Insert a validated generated plan in one transaction.
+
+    Ids invented by the model are ignored: tags are deduplicated by name and
+    every row gets a server-generated id. Tags, tasks and user_tasks links are
+    each written with a single executemany, which SQLAlchemy batches into
+    multi-row INSERTs. Returns the new task ids and the project's new version.
+    """
+    tag_rows = {}
+    task_rows = []
+    for task in plan.tasks:
+        tag_id = None
+        if task.tag:
+            if task.tag.name not in tag_rows:
+                tag_rows[task.tag.name] = {'id': str(uuid4()), 'name': task.tag.name, 'color': task.tag.color, 'project_id': project_id}
+            tag_id = tag_rows[task.tag.name]['id']
+        task_rows.append({
+            'id': str(uuid4()),
+            'name': task.name,
+            'description': task.description,
+            'finished': task.finished,
+            'date': task.date,
+            'project_id': project_id,
+            'tag_id': tag_id
+        })
+
+    try:
+        if tag_rows:
+            db.execute(insert(Tag), list(tag_rows.values()))
+        db.execute(insert(Task), task_rows)
+        db.execute(insert(user_tasks), [{'user_id': assignee_id, 'task_id': row['id']} for row in task_rows])
+        delta = StatsDelta()
+        for row in task_rows:
+            delta.add(row['tag_id'], row['finished'])
+        delta.apply(project_id, db)
+        version = bump_project_version(project_id, db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return [row['id'] for row in task_rows], version
+
+def update_tasks_setwise(updates: dict, db: Session):
+    """Write per-task column changes with one UPDATE per distinct set of columns.
+
+    Columns set to the same value for every task are plain assignments;
+    columns that differ per task become a CASE on the task id.
+    """
+    by_columns = defaultdict(dict)
+    for task_id, values in updates.items():
+        if values:
+            by_columns[tuple(sorted(values))][task_id] = values
+    for columns, tasks in by_columns.items():
+        assignments = {}
+        for name in columns:
+            column = Task.__table__.c[name]
+            values = {task_id: changes[name] for task_id, changes in tasks.items()}
+            if len(set(values.values())) == 1:
+                assignments[name] = next(iter(values.values()))
+            else:
+                assignments[name] = case({task_id: literal(value, column.type) for task_id, value in values.items()}, value=Task.id, else_=column)
+        db.execute(update(Task).where(Task.id.in_(list(tasks))).values(assignments).execution_options(synchronize_session=False))
+
+def apply_task_operations(project_id: str, user_id: str, operations, db: Session):
+    """Apply a batch of task operations for one project as one unit.
+
+    Referenced tasks, tags and users are each checked with a single SELECT,
+    which also provides the before-state for the project aggregates.
+    The batch is then written set-wise: one INSERT for new tasks, one for new
+    assignments, one UPDATE per distinct set of changed columns and one
+    DELETE, whatever the number of operations. Changes to the same task merge
+    in request order.
+
+    If any operation refers to something that does not exist in the project,
+    or to a task deleted earlier in the batch, nothing is written. The
+    results then mark the failing operations "error" and the rest "skipped".
+
+    Returns (results, changes, version). `changes` summarises what was written
+    for the change feed, and `version` is None when nothing was written. The
+    caller commits or rolls back.
+    """
+    task_ids = {op.task_id for op in operations if op.op != "create"}
+    tag_ids = {op.tag_id for op in operations if getattr(op, "tag_id", None)}
+    user_ids = {uid for op in operations for uid in (getattr(op, "user_ids", None) or getattr(op, "assignee_ids", None) or ())}
+
+    known_tasks = {
+        row.id: row for row in db.execute(select(Task.id, Task.tag_id, Task.finished).where(Task.project_id == project_id, Task.id.in_(task_ids)))
+    } if task_ids else {}
+    known_tags = set(db.scalars(select(Tag.id).where(Tag.project_id == project_id, Tag.id.in_(tag_ids)))) if tag_ids else set()
+    known_users = set(db.scalars(select(User.id).where(User.id.in_(user_ids)))) if user_ids else set()
+
+    results = []
+    failed = False
+    new_tasks = []
+    new_links = []
+    updates = {}
+    assigned = set()
+    deleted = set()
+
+    for index, op in enumerate(operations):
+        result = {'index': index, 'op': op.op, 'task_id': getattr(op, 'task_id', None), 'status': 'ok'}
+        results.append(result)
+        assignees = (op.assignee_ids or [user_id]) if op.op == "create" else getattr(op, 'user_ids', None) or []
+
+        if op.op != "create" and (op.task_id not in known_tasks or op.task_id in deleted):
+            result.update(status='error', detail="Task not found.")
+        elif getattr(op, 'tag_id', None) and op.tag_id not in known_tags:
+            result.update(status='error', detail="Tag not found.")
+        elif op.op in ("create", "assign") and any(uid not in known_users and uid != user_id for uid in assignees):
+            result.update(status='error', detail="User not found.")
+        if result['status'] == 'error':
+            failed = True
+            continue
+
+        if op.op == "create":
+            result['task_id'] = str(uuid4())
+            new_tasks.append({
+                'id': result['task_id'],
+                'name': op.name,
+                'description': op.description,
+                'finished': op.finished,
+                'date': op.date or datetime.utcnow(),
+                'project_id': project_id,
+                'tag_id': op.tag_id
+            })
+            new_links.extend({'user_id': uid, 'task_id': result['task_id']} for uid in dict.fromkeys(assignees))
+        elif op.op == "update":
+            updates.setdefault(op.task_id, {}).update(op.model_dump(exclude_unset=True, exclude={'op', 'task_id'}))
+        elif op.op == "finish":
+            updates.setdefault(op.task_id, {})['finished'] = op.finished
+        elif op.op == "retag":
+            updates.setdefault(op.task_id, {})['tag_id'] = op.tag_id
+        elif op.op == "assign":
+            assigned.update((uid, op.task_id) for uid in assignees)
+        elif op.op == "delete":
+            deleted.add(op.task_id)
+            updates.pop(op.task_id, None)
+            assigned = {(uid, task_id) for uid, task_id in assigned if task_id != op.task_id}
+
+    if failed:
+        for result in results:
+            if result['status'] == 'ok':
+                result['status'] = 'skipped'
+        return results, None, None
+
+    if new_tasks:
+        db.execute(insert(Task), new_tasks)
+    if assigned:
+        existing = set(db.execute(
+            select(user_tasks.c.user_id, user_tasks.c.task_id).where(user_tasks.c.task_id.in_({task_id for _, task_id in assigned}))
+        ).tuples())
+        new_links.extend({'user_id': uid, 'task_id': task_id} for uid, task_id in sorted(assigned - existing))
+    if new_links:
+        db.execute(insert(user_tasks), new_links)
+    update_tasks_setwise(updates, db)
+    if deleted:
+        db.execute(delete(Task).where(Task.id.in_(deleted)).execution_options(synchronize_session=False))
+
+    delta = StatsDelta()
+    for row in new_tasks:
+        delta.add(row['tag_id'], row['finished'])
+    for task_id, values in updates.items():
+        old = known_tasks[task_id]
+        delta.change(old.tag_id, old.finished, values.get('tag_id', old.tag_id), values.get('finished', old.finished), 'date' in values)
+    for task_id in deleted:
+        old = known_tasks[task_id]
+        delta.remove(old.tag_id, old.finished)
+    delta.apply(project_id, db)
+    version = bump_project_version(project_id, db)
+
+    changes = {
+        'created': new_tasks,
+        'updated': updates,
+        'assigned': new_links,
+        'deleted': sorted(deleted)
+    }
+    return results, changes, version
+
+def serialize_tag(tag: Tag):
+    return {
+        'id': tag.id,
+        'name': tag.name,
+        'color': tag.color,
+        'project_id': tag.project_id
+    }
+
+def serialize_task(task: Task):
+    tag = task.tag
+    return {
         'id': task.id,
         'project_id': task.project_id,
         'name': task.name,
         'description': task.description,
         'date': task.date,
         'finished': task.finished,
-        'assignees': [{'id': assignee.id, 'name': assignee.name} for assignee in assignees],
+        'assignees': [{'id': assignee.id, 'name': assignee.name} for assignee in task.assignees],
         'tag': {
             'id': tag.id,
             'name': tag.name,
             'color': tag.color
         } if tag else None
     }
-    return task_data
-
-def organize_tasks(project_id: str, db: Session):
-    tasks = db.query(Task).filter(Task.project_id == project_id).all()
-    tasks_with_data = []
-
-    for task in tasks:
-        tag = task.tag 
-        assignees = task.assignees
-        task_data = {
-            'id': task.id,
-            'project_id': task.project_id,
-            'name': task.name,
-            'description': task.description,
-            'date': task.date,
-            'finished': task.finished,
-            'assignees': [{'id': assignee.id, 'name': assignee.name} for assignee in assignees],
-            'tag': {
-                'id': tag.id,
-                'name': tag.name,
-                'color': tag.color
-            } if tag else None
-        }
-        tasks_with_data.append(task_data)
-
-    return tasks_with_data
 
-def organize_project(project_id: str, db: Session):
-    project = db.query(Project).filter(Project.id == project_id).first()
+def serialize_project(project: Project):
     owner = project.owner
-    assignees = project.assignees
-    project_data = {
+    return {
         'id': project.id,
         'name': project.name,
         'description': project.description,
@@ -70,40 +293,145 @@ def organize_project(project_id: str, db: Session):
         'priority': project.priority,
         'date_start': project.date_start,
         'date_end': project.date_end,
-        'tasks': organize_tasks(db=db, project_id=project.id),
+        'tasks': [serialize_task(task) for task in project.tasks],
         'owner': {
             'id': owner.id,
             'name': owner.name
         } if owner else None,
-        'assignees': [{'id': assignee.id, 'name': assignee.name} for assignee in assignees],
-        'tags': get_tags(project_id=project.id, db=db)
+        'assignees': [{'id': assignee.id, 'name': assignee.name} for assignee in project.assignees],
+        'tags': [serialize_tag(tag) for tag in project.tags]
     }
-    return project_data
+
+def organize_task(task_id: str, db: Session):
+    tasks = load_tasks(db, Task.id == task_id)
+    if not tasks:
+        return None
+    return serialize_task(tasks[0])
+
+def organize_tasks(project_id: str, db: Session):
+    return [serialize_task(task) for task in load_tasks(db, Task.project_id == project_id)]
+
+def organize_tasks_page(project_id: str, db: Session, page: PageParams):
+    query = task_tree_query(db, Task.project_id == project_id)
+    tasks, next_cursor = paginate(query, Task.date, Task.id, page)
+    return [serialize_task(task) for task in tasks], next_cursor
+
+def organize_project(project_id: str, db: Session):
+    projects = load_project_tree(db, Project.id == project_id)
+    if not projects:
+        return None
+    return serialize_project(projects[0])
 
 def organize_projects(owner_id: str, db: Session):
-    projects = db.query(Project).filter(Project.owner_id == owner_id).all()
-    projects_with_tasks = []
-
-    for project in projects:
-        owner = project.owner
-        assignees = project.assignees
-
-        project_data = {
-            'id': project.id,
-            'name': project.name,
-            'description': project.description,
-            'finished': project.finished,
-            'priority': project.priority,
-            'date_start': project.date_start,
-            'date_end': project.date_end,
-            'tasks': organize_tasks(db=db, project_id=project.id),
-            'owner': {
-                'id': owner.id,
-                'name': owner.name
-            } if owner else None,
-            'assignees': [{'id': assignee.id, 'name': assignee.name} for assignee in assignees],
-            'tags': get_tags(project_id=project.id, db=db)
+    return [serialize_project(project) for project in load_project_tree(db, Project.owner_id == owner_id)]
+
+
+def organize_projects_page(owner_id: str, db: Session, page: PageParams):
+    query = project_tree_query(db, Project.owner_id == owner_id)
+    projects, next_cursor = paginate(query, Project.date_start, Project.id, page)
+    return [serialize_project(project) for project in projects], next_cursor
+
+
+# Only the columns the /users directory actually returns.
+USER_DIRECTORY_COLUMNS = (User.id, User.name, User.email, User.gender, User.DOB, User.picture)
+
+def user_directory_query(db: Session):
+    return db.query(*USER_DIRECTORY_COLUMNS)
+
+def organize_users(rows, db: Session):
+    """Build /users entries for a batch of projected user rows.
+
+    Assigned projects and tasks for the whole batch are fetched with one
+    query each rather than lazily per user.
+    """
+    user_ids = [row.id for row in rows]
+    projects = defaultdict(list)
+    tasks = defaultdict(list)
+
+    if user_ids:
+        project_rows = (
+            db.query(user_projects.c.user_id, Project.id, Project.name)
+            .join(Project, Project.id == user_projects.c.project_id)
+            .filter(user_projects.c.user_id.in_(user_ids))
+        )
+        for user_id, project_id, name in project_rows:
+            projects[user_id].append({'id': project_id, 'name': name})
+
+        task_rows = (
+            db.query(user_tasks.c.user_id, Task.id, Task.name)
+            .join(Task, Task.id == user_tasks.c.task_id)
+            .filter(user_tasks.c.user_id.in_(user_ids))
+        )
+        for user_id, task_id, name in task_rows:
+            tasks[user_id].append({'id': task_id, 'name': name})
+
+    return [
+        {
+            'name': row.name,
+            'id': row.id,
+            'email': row.email,
+            'gender': row.gender,
+            'DOB': row.DOB,
+            'picture': row.picture,
+            'projects': projects.get(row.id) or None,
+            'tasks': tasks.get(row.id) or None
+        }
+        for row in rows
+    ]
+
+def iter_users(db: Session, batch_size: int):
+    """Yield /users entries in (name, id) order, `batch_size` users at a time."""
+    page = PageParams(limit=batch_size, cursor=None)
+    while True:
+        rows, next_cursor = paginate(user_directory_query(db), User.name, User.id, page)
+        yield from organize_users(rows, db)
+        if not next_cursor:
+            return
+        page = PageParams(limit=batch_size, cursor=next_cursor)
+
+def calendar_tasks(user_id: str, start: datetime, end: datetime, db: Session):
+    """Tasks assigned to `user_id` dated in [start, end), with tag and project name, in date order.
+
+    One query over projected columns. The join can be driven from either
+    side: the date range on ix_tasks_date probing the (user_id, task_id)
+    primary key of user_tasks, or that key probing tasks by id. The planner
+    takes whichever is narrower, so a one-week window does not read years of
+    assignments.
+    """
+    rows = db.execute(
+        select(
+            Task.id, Task.name, Task.description, Task.date, Task.finished, Task.project_id,
+            Project.name.label('project_name'), Tag.id.label('tag_id'), Tag.name.label('tag_name'), Tag.color.label('tag_color')
+        )
+        .join(user_tasks, and_(user_tasks.c.task_id == Task.id, user_tasks.c.user_id == user_id))
+        .join(Project, Project.id == Task.project_id)
+        .outerjoin(Tag, Tag.id == Task.tag_id)
+        .where(Task.date >= start, Task.date < end)
+        .order_by(Task.date, Task.id)
+    )
+    return [
+        {
+            'id': row.id,
+            'name': row.name,
+            'description': row.description,
+            'date': row.date,
+            'finished': row.finished,
+            'project_id': row.project_id,
+            'project_name': row.project_name,
+            'tag': {'id': row.tag_id, 'name': row.tag_name, 'color': row.tag_color} if row.tag_id else None
         }
-        projects_with_tasks.append(project_data)
+        for row in rows
+    ]
+
+async def load_project_tree_async(db: AsyncSession, *criteria):
+    result = await db.execute(select(Project).options(*PROJECT_TREE_OPTIONS).where(*criteria))
+    return result.scalars().all()
+
+async def organize_project_async(project_id: str, db: AsyncSession):
+    projects = await load_project_tree_async(db, Project.id == project_id)
+    if not projects:
+        return None
+    return serialize_project(projects[0])
 
-    return projects_with_tasks
\ No newline at end of file
+async def get_project_version_async(project_id: str, db: AsyncSession):
+    return await db.scalar(select(Project.version).where(Project.id == project_id))
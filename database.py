@@ -1,22 +1,312 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 import os
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+from starlette.requests import HTTPConnection
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from dotenv import load_dotenv
 
 load_dotenv()
 
-engine = create_engine(
-    os.getenv("SUPABASE_DATABASE_URL")
-)
+DATABASE_URL = os.getenv("SUPABASE_DATABASE_URL")
+# Optional read replica for GET requests. To try the routing locally, point
+# it at a copy of the SQLite file and change a row in one of the two.
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+PRIMARY_PIN_MAX_CLIENTS = int(os.getenv("PRIMARY_PIN_MAX_CLIENTS", "10000"))
+
+# Pool sizing is per process: every container (and worker) holds up to
+# DB_POOL_SIZE + DB_MAX_OVERFLOW connections. DB_POOL_SIZE=0 disables local
+# pooling and opens a connection per checkout, for use behind an external pooler.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Set when the URL points at a transaction-mode pooler (the Supabase pooler on
+# port 6543, PgBouncer): consecutive transactions may land on different server
+# connections, so the driver must not keep server-side prepared statements.
+DB_POOLER_MODE = os.getenv("DB_POOLER_MODE", "false").lower() == "true"
+
+
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys, and so ON DELETE CASCADE, unless asked per connection.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def record(self, waited: float, timed_out=False):
+        with self._lock:
+            self.checkouts += not timed_out
+            self.timeouts += timed_out
+            self.wait_seconds += waited
+
+
+class TimedPool:
+    """Records how long each checkout took to get a connection, including waits for a free one.
+
+    The stats live on the class because SQLAlchemy rebuilds pools with
+    `self.__class__` after a disconnect; `create_db_engine` makes one subclass per engine.
+    """
+
+    stats = None
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+
+class TimedQueuePool(TimedPool, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def pooler_safe_options(url):
+    """Driver options that keep a connection usable behind a transaction-mode pooler."""
+    if url.drivername == "postgresql+asyncpg":
+        # asyncpg prepares every statement; naming them uniquely and not
+        # caching them keeps them from colliding on shared server connections.
+        return url.update_query_dict({"prepared_statement_cache_size": "0"}), {
+            "statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    if url.drivername == "postgresql+psycopg":
+        return url, {"prepare_threshold": None}
+    # psycopg2 never prepares statements server-side.
+    return url, {}
+
+
+def create_db_engine(url, is_async=False, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT,
+                     pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=DB_POOL_PRE_PING, pooler_mode=DB_POOLER_MODE):
+    """Build a sync or async engine with the configured pool; its checkout stats are on `engine.pool.stats`."""
+    url = make_url(url)
+    options = {"pool_pre_ping": pool_pre_ping}
+    if url.get_backend_name() == "sqlite" and (is_async or url.database in (None, "", ":memory:")):
+        # In-memory SQLite lives in a single connection, and a pooled aiosqlite
+        # connection's thread keeps the process from exiting; both keep the dialect's default pool.
+        pass
+    elif pool_size <= 0:
+        options["poolclass"] = NullPool
+    else:
+        base = TimedAsyncQueuePool if is_async else TimedQueuePool
+        options.update(
+            poolclass=type(base.__name__, (base,), {"stats": PoolStats()}),
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle
+        )
+    if pooler_mode:
+        url, connect_args = pooler_safe_options(url)
+        options["connect_args"] = connect_args
+
+    if is_async:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        engine = create_async_engine(url, **options)
+        sync_engine = engine.sync_engine
+    else:
+        engine = sync_engine = create_engine(url, **options)
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", enable_sqlite_foreign_keys)
+    return engine
+
+
+def pool_status(engine):
+    """Current occupancy and cumulative checkout stats of an engine's pool."""
+    pool = getattr(engine, "sync_engine", engine).pool
+    stats = getattr(pool, "stats", None) or PoolStats()
+    return {
+        "size": pool.size() if isinstance(pool, QueuePool) else 0,
+        "checked_out": pool.checkedout() if isinstance(pool, QueuePool) else 0,
+        "overflow": max(pool.overflow(), 0) if isinstance(pool, QueuePool) else 0,
+        "checkouts": stats.checkouts,
+        "wait_seconds": stats.wait_seconds,
+        "timeouts": stats.timeouts,
+    }
+
+
+engine = create_db_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+class ReplicaSession(Session):
+    """Session on the read replica; flushing raises so a stray write fails loudly."""
+
+def reject_replica_writes(session, flush_context, instances):
+    raise RuntimeError("The read replica session is read-only; write through the primary.")
+
+event.listen(ReplicaSession, "before_flush", reject_replica_writes)
+
+replica_engine = create_db_engine(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL else None
+ReplicaSessionLocal = None
+if replica_engine is not None:
+    ReplicaSessionLocal = sessionmaker(class_=ReplicaSession, autocommit=False, autoflush=False, bind=replica_engine)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+READ_METHODS = ("GET", "HEAD")
+
+
+class PrimaryPins:
+    """Clients that wrote recently, and so read from the primary until their window ends.
+
+    A replica may lag the primary, so a client reading its own write from it
+    could see the old value. Every write pins the client, identified by its
+    bearer token, for `window` seconds. Pins are per process: a client whose
+    next request lands in another container can still read a lagging replica
+    within the window.
+    """
+
+    def __init__(self, window: float = READ_YOUR_WRITES_SECONDS, maxsize: int = PRIMARY_PIN_MAX_CLIENTS):
+        self.window = window
+        self.maxsize = maxsize
+        self.replica_reads = 0
+        self.pinned_reads = 0
+        self._pins = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pin(self, client: str):
+        with self._lock:
+            self._pins[client] = time.monotonic() + self.window
+            self._pins.move_to_end(client)
+            while len(self._pins) > self.maxsize:
+                self._pins.popitem(last=False)
+
+    def route_read(self, client: str):
+        """True when the client's read must go to the primary."""
+        with self._lock:
+            expires_at = self._pins.get(client)
+            pinned = expires_at is not None and expires_at > time.monotonic()
+            if expires_at is not None and not pinned:
+                del self._pins[client]
+            if pinned:
+                self.pinned_reads += 1
+            else:
+                self.replica_reads += 1
+            return pinned
+
+    def stats(self):
+        with self._lock:
+            return {"pinned": len(self._pins), "replica_reads": self.replica_reads, "pinned_reads": self.pinned_reads}
+
+
+primary_pins = PrimaryPins()
+
+
+def is_write(connection: HTTPConnection):
+    # WebSockets and anything but GET/HEAD count as writes and use the primary.
+    return connection.scope["type"] != "http" or connection.scope["method"] not in READ_METHODS
+
+
+def reads_from_replica(connection: HTTPConnection):
+    """True for a read whose client has not written within its pin window; counts the routing decision."""
+    return not is_write(connection) and not primary_pins.route_read(connection.headers.get("authorization"))
+
+
+def read_session_factory(connection: HTTPConnection):
+    """The sessionmaker a request should use: the replica for reads, unless the client wrote recently."""
+    if ReplicaSessionLocal is not None and reads_from_replica(connection):
+        return ReplicaSessionLocal
+    return SessionLocal
+
+
+def writer_to_pin(connection: HTTPConnection):
+    """The client to pin to the primary when this request writes and a replica is in use, else None."""
+    client = connection.headers.get("authorization")
+    if REPLICA_DATABASE_URL and client is not None and is_write(connection):
+        return client
+    return None
+
+
+def get_db(connection: HTTPConnection):
+    client = writer_to_pin(connection)
+    if client:
+        primary_pins.pin(client)
+    db = read_session_factory(connection)()
     try:
         yield db
     finally:
         db.close()
+        if client:
+            # The window counts from the end of the write, which may have been slow.
+            primary_pins.pin(client)
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str):
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+ASYNC_REPLICA_DATABASE_URL = os.getenv("ASYNC_REPLICA_DATABASE_URL") or (to_async_url(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL else None)
+
+# The async engines are built on first use so the sync-only deployment does not
+# need asyncpg/aiosqlite installed.
+async_engine = None
+AsyncSessionLocal = None
+async_replica_engine = None
+AsyncReplicaSessionLocal = None
+
+def get_async_sessionmaker():
+    global async_engine, AsyncSessionLocal, async_replica_engine, AsyncReplicaSessionLocal
+    if AsyncSessionLocal is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        from instrumentation import instrument_engine
+
+        if ASYNC_REPLICA_DATABASE_URL:
+            async_replica_engine = create_db_engine(ASYNC_REPLICA_DATABASE_URL, is_async=True)
+            instrument_engine(async_replica_engine.sync_engine)
+            AsyncReplicaSessionLocal = async_sessionmaker(
+                async_replica_engine, sync_session_class=ReplicaSession, autoflush=False, expire_on_commit=False
+            )
+        async_engine = create_db_engine(ASYNC_DATABASE_URL, is_async=True)
+        instrument_engine(async_engine.sync_engine)
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return AsyncSessionLocal
+
+def async_read_session_factory(connection: HTTPConnection):
+    """read_session_factory for the async engines, with the same routing and pins."""
+    primary = get_async_sessionmaker()
+    if AsyncReplicaSessionLocal is not None and reads_from_replica(connection):
+        return AsyncReplicaSessionLocal
+    return primary
+
+async def get_async_db(connection: HTTPConnection):
+    client = writer_to_pin(connection)
+    if client:
+        primary_pins.pin(client)
+    try:
+        async with async_read_session_factory(connection)() as db:
+            yield db
+    finally:
+        if client:
+            primary_pins.pin(client)
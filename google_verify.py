@@ -1,14 +1,133 @@
-from google.oauth2 import id_token
-from google.auth.transport import requests
+import base64
+import hashlib
+import json
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
 
 client_id = os.getenv("client_id")
 
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+GOOGLE_CERTS_DEFAULT_MAX_AGE = int(os.getenv("GOOGLE_CERTS_DEFAULT_MAX_AGE", "3600"))
+GOOGLE_TOKEN_CACHE_SIZE = int(os.getenv("GOOGLE_TOKEN_CACHE_SIZE", "4096"))
+GOOGLE_CLOCK_SKEW = int(os.getenv("GOOGLE_CLOCK_SKEW", "10"))
+# Lower bound between refreshes triggered by unknown key ids, so tokens with
+# made-up `kid`s cannot turn into a stream of certificate fetches.
+GOOGLE_CERTS_MIN_REFRESH_INTERVAL = int(os.getenv("GOOGLE_CERTS_MIN_REFRESH_INTERVAL", "60"))
 
-def verify_google_token(token):
+
+def max_age(cache_control: str):
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else GOOGLE_CERTS_DEFAULT_MAX_AGE
+
+
+def token_key_id(token: str):
+    header = token.split(".", 1)[0]
     try:
-        idinfo = id_token.verify_oauth2_token(token, requests.Request(), client_id)
+        return json.loads(base64.urlsafe_b64decode(header + "=" * (-len(header) % 4))).get("kid")
+    except (ValueError, AttributeError):
+        return None
+
+
+class GoogleTokenVerifier:
+    """Verifies Google ID tokens against an in-memory certificate set.
+
+    Certificates are fetched over one pooled HTTP session and refreshed by a
+    background timer shortly before the response's Cache-Control max-age runs
+    out, or on demand when a token names a key id we have not seen (key
+    rotation). Tokens that verify are cached until their `exp`, so the common
+    case is a dictionary lookup or a local signature check, never a network
+    round trip. `requests` and `google.auth` are imported on the first
+    verification rather than when the app starts.
+    """
+
+    def __init__(self, audience=client_id, certs_url=GOOGLE_CERTS_URL, session=None,
+                 cache_size=GOOGLE_TOKEN_CACHE_SIZE, clock_skew=GOOGLE_CLOCK_SKEW, refresh_in_background=True):
+        self.audience = audience
+        self.certs_url = certs_url
+        self.session = session
+        self.cache_size = cache_size
+        self.clock_skew = clock_skew
+        self.refresh_in_background = refresh_in_background
+        self.certs = {}
+        self.certs_expire_at = 0
+        self.certs_fetched_at = None
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._timer = None
+
+    def refresh_certs(self):
+        with self._refresh_lock:
+            if self.session is None:
+                import requests
+                self.session = requests.Session()
+            response = self.session.get(self.certs_url, timeout=10)
+            response.raise_for_status()
+            ttl = max_age(response.headers.get("Cache-Control"))
+            self.certs = response.json()
+            self.certs_fetched_at = time.monotonic()
+            self.certs_expire_at = self.certs_fetched_at + ttl
+            if self.refresh_in_background:
+                self._schedule_refresh(ttl)
+
+    def _schedule_refresh(self, ttl: int):
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(max(ttl * 0.9, 1), self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh_certs()
+        except Exception as e:
+            print(f"Google certificate refresh failed: {e}")
+            # Keep serving the current set and try again shortly.
+            self._schedule_refresh(60)
+
+    def _certs_for(self, key_id):
+        now = time.monotonic()
+        if not self.certs or now >= self.certs_expire_at:
+            self.refresh_certs()
+        elif key_id and key_id not in self.certs and now - self.certs_fetched_at >= GOOGLE_CERTS_MIN_REFRESH_INTERVAL:
+            self.refresh_certs()
+        return self.certs
+
+    def verify(self, token: str):
+        cache_key = hashlib.sha256(token.encode()).hexdigest()
+        now = time.time()
+        with self._lock:
+            cached = self._tokens.get(cache_key)
+            if cached and cached["exp"] > now:
+                self._tokens.move_to_end(cache_key)
+                return cached
+
+        from google.auth import jwt
+
+        certs = self._certs_for(token_key_id(token))
+        idinfo = jwt.decode(token, certs=certs, audience=self.audience, clock_skew_in_seconds=self.clock_skew)
+        if idinfo.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError("Wrong issuer.")
+
+        with self._lock:
+            self._tokens[cache_key] = idinfo
+            while len(self._tokens) > self.cache_size:
+                self._tokens.popitem(last=False)
         return idinfo
-    except ValueError:
+
+
+google_verifier = GoogleTokenVerifier()
+
+
+def verify_google_token(token):
+    import requests
+
+    try:
+        return google_verifier.verify(token)
+    except (ValueError, requests.RequestException):
         print("Invalid Token")
-        return None
\ No newline at end of file
+        return None
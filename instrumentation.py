@@ -0,0 +1,247 @@
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from sqlalchemy import event
+from starlette.routing import Match
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+
+current_stats = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_time", "slowest_time", "slowest_sql", "serialization_time")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+        self.serialization_time = 0.0
+
+
+def normalize_sql(statement: str):
+    """Collapse whitespace, literals and expanded IN lists so similar statements read alike."""
+    statement = re.sub(r"'(?:[^']|'')*'", "?", statement)
+    statement = re.sub(r"\b\d+\b", "?", statement)
+    statement = re.sub(r"%\(\w+\)s|:\w+|\$\d+", "?", statement)
+    statement = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?, ...)", statement)
+    return re.sub(r"\s+", " ", statement).strip()
+
+
+# The start time lives on the statement's execution context, which is dropped
+# with the statement whether or not it succeeds; a per-connection stack would
+# keep the start of every statement that raised.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    took = time.perf_counter() - context._query_start
+    stats = current_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += took
+        if took > stats.slowest_time:
+            stats.slowest_time = took
+            stats.slowest_sql = statement
+    if SLOW_QUERY_MS and took * 1000 >= SLOW_QUERY_MS:
+        print(f"Slow query ({took * 1000:.1f} ms): {normalize_sql(statement)}")
+
+
+def instrument_engine(engine):
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class TimedORJSONResponse(ORJSONResponse):
+    """ORJSONResponse that records how long rendering the body took."""
+
+    def render(self, content):
+        started = time.perf_counter()
+        body = super().render(content)
+        stats = current_stats.get()
+        if stats is not None:
+            stats.serialization_time += time.perf_counter() - started
+        return body
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+METRICS = {
+    "http_request_duration_seconds": ("Time from request start to response start.", LATENCY_BUCKETS),
+    "http_request_db_seconds": ("Time spent executing SQL per request.", LATENCY_BUCKETS),
+    "http_request_db_statements": ("SQL statements executed per request.", STATEMENT_BUCKETS),
+    "http_request_serialization_seconds": ("Time spent rendering the response body per request.", LATENCY_BUCKETS),
+}
+
+
+class RouteMetrics:
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method: str, route: str, duration: float, stats: RequestStats):
+        values = {
+            "http_request_duration_seconds": duration,
+            "http_request_db_seconds": stats.db_time,
+            "http_request_db_statements": stats.statements,
+            "http_request_serialization_seconds": stats.serialization_time,
+        }
+        with self._lock:
+            for name, value in values.items():
+                key = (name, method, route)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram(METRICS[name][1])
+                self._histograms[key].observe(value)
+
+    def render(self, extra=()):
+        lines = []
+        with self._lock:
+            for name, (help_text, buckets) in METRICS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, method, route), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    labels = f'method="{method}",route="{route}"'
+                    cumulative = 0
+                    for bound, count in zip(buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        for name, kind, help_text, value in extra:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            # A dict holds one value per label set, e.g. {'engine="primary"': 3}.
+            for labels, sample in (value.items() if isinstance(value, dict) else [(None, value)]):
+                lines.append(f"{name}{{{labels}}} {sample}" if labels else f"{name} {sample}")
+        return "\n".join(lines) + "\n"
+
+
+route_metrics = RouteMetrics()
+
+
+def route_template(app, scope):
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    for candidate in app.router.routes:
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return candidate.path
+    return "unmatched"
+
+
+class InstrumentationMiddleware:
+    """Records per-request SQL and timing and reports it in a Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        reported = [False]
+
+        def record():
+            if not reported[0]:
+                reported[0] = True
+                route = route_template(scope["app"], scope) if "app" in scope else "unmatched"
+                route_metrics.observe(scope["method"], route, time.perf_counter() - started, stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total = (time.perf_counter() - started) * 1000
+                timing = (
+                    f'db;dur={stats.db_time * 1000:.2f};desc="{stats.statements} statements", '
+                    f'db-slowest;dur={stats.slowest_time * 1000:.2f}, '
+                    f'serialize;dur={stats.serialization_time * 1000:.2f}, '
+                    f'total;dur={total:.2f}'
+                )
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode())]
+                record()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            record()
+            current_stats.reset(token)
+
+
+metrics_routes = APIRouter()
+
+
+@metrics_routes.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    from principal_cache import principal_cache
+    from passwords import hash_executor
+    from changefeed import change_hub
+    import database
+    from database import pool_status, primary_pins
+
+    cache = principal_cache.stats()
+    hashing = hash_executor.stats()
+    feed = change_hub.stats()
+    engines = {
+        'engine="primary"': database.engine,
+        'engine="replica"': database.replica_engine,
+        'engine="async_primary"': database.async_engine,
+        'engine="async_replica"': database.async_replica_engine,
+    }
+    pools = {labels: pool_status(pool_engine) for labels, pool_engine in engines.items() if pool_engine is not None}
+    pool = {key: {labels: status[key] for labels, status in pools.items()} for key in pools['engine="primary"']}
+    routing = primary_pins.stats()
+    extra = [
+        ("principal_cache_hits_total", "counter", "Authenticated principal cache hits.", cache["hits"]),
+        ("principal_cache_misses_total", "counter", "Authenticated principal cache misses.", cache["misses"]),
+        ("principal_cache_evictions_total", "counter", "Authenticated principal cache LRU evictions.", cache["evictions"]),
+        ("password_hash_seconds_total", "counter", "Time spent hashing passwords.", hashing["hash"]["latency_seconds"]),
+        ("password_hash_total", "counter", "Passwords hashed.", hashing["hash"]["count"]),
+        ("password_verify_seconds_total", "counter", "Time spent verifying passwords.", hashing["verify"]["latency_seconds"]),
+        ("password_verify_total", "counter", "Passwords verified.", hashing["verify"]["count"]),
+        ("password_queue_wait_seconds_total", "counter", "Time password jobs waited for a hashing thread.", hashing["queue_wait_seconds"]),
+        ("password_rejected_total", "counter", "Password jobs rejected because the executor was saturated.", hashing["rejected"]),
+        ("changefeed_subscribers", "gauge", "Open project change-feed subscriptions.", feed["subscribers"]),
+        ("changefeed_events_published_total", "counter", "Project change events published.", feed["published"]),
+        ("changefeed_overflows_total", "counter", "Subscriptions dropped because the client fell behind.", feed["overflows"]),
+        ("changefeed_resyncs_total", "counter", "Resumes that could not be served from history.", feed["resyncs"]),
+        ("db_pool_size", "gauge", "Connections the pool keeps open.", pool["size"]),
+        ("db_pool_checked_out", "gauge", "Connections currently checked out of the pool.", pool["checked_out"]),
+        ("db_pool_overflow", "gauge", "Checked-out connections opened beyond the pool size.", pool["overflow"]),
+        ("db_pool_checkouts_total", "counter", "Connections handed out by the pool.", pool["checkouts"]),
+        ("db_pool_checkout_wait_seconds_total", "counter", "Time spent obtaining connections from the pool.", pool["wait_seconds"]),
+        ("db_pool_timeouts_total", "counter", "Checkouts that gave up waiting for a free connection.", pool["timeouts"]),
+        ("db_replica_reads_total", "counter", "Read requests routed to the replica.", routing["replica_reads"]),
+        ("db_pinned_reads_total", "counter", "Read requests kept on the primary because the client wrote recently.", routing["pinned_reads"]),
+    ]
+    return route_metrics.render(extra)
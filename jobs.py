@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from uuid import uuid4
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "32"))
+JOB_RETRIES = int(os.getenv("JOB_RETRIES", "2"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "2"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "300"))
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", "1000"))
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobFailed(Exception):
+    """Raised by a job function to report a failure worth retrying."""
+
+
+class Job:
+    def __init__(self, kind: str, owner_id: str):
+        self.id = str(uuid4())
+        self.kind = kind
+        self.owner_id = owner_id
+        self.status = "queued"
+        self.attempts = 0
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """Bounded in-process job runner.
+
+    At most `max_workers` jobs run at once and at most `max_pending` may be
+    queued or running; `submit` raises JobQueueFull beyond that so callers can
+    shed load instead of piling up work. A failing job is retried with
+    exponential backoff until it succeeds, runs out of attempts or passes its
+    `timeout` budget. The timeout is checked between attempts; each attempt is
+    expected to bound its own blocking calls.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING, retries=JOB_RETRIES,
+                 backoff=JOB_RETRY_BACKOFF, timeout=JOB_TIMEOUT, history_size=JOB_HISTORY_SIZE):
+        self.max_pending = max_pending
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.history_size = history_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jobs")
+        self._jobs = OrderedDict()
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, owner_id: str, fn, *args, **kwargs):
+        job = Job(kind, owner_id)
+        with self._lock:
+            if self._active >= self.max_pending:
+                raise JobQueueFull()
+            self._active += 1
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        while len(self._jobs) > self.history_size:
+            oldest = next((key for key, job in self._jobs.items() if job.finished_at), None)
+            if oldest is None:
+                return
+            del self._jobs[oldest]
+
+    def _run(self, job: Job, fn, args, kwargs):
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        deadline = time.monotonic() + self.timeout
+        try:
+            while True:
+                job.attempts += 1
+                try:
+                    job.result = fn(*args, **kwargs)
+                    job.status = "succeeded"
+                    job.error = None
+                    return
+                except Exception as e:
+                    job.error = str(e)
+                    delay = self.backoff * (2 ** (job.attempts - 1))
+                    if job.attempts > self.retries:
+                        job.status = "failed"
+                        return
+                    if time.monotonic() + delay > deadline:
+                        job.status = "timed_out"
+                        return
+                    print(f"Job {job.id} attempt {job.attempts} failed: {e}")
+                    time.sleep(delay)
+        finally:
+            job.finished_at = datetime.utcnow()
+            with self._lock:
+                self._active -= 1
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+job_queue = JobQueue()
@@ -0,0 +1,81 @@
+"""Versioned schema migrations.
+
+Each module in migrations/ is named `<version>_<name>.py` and defines
+`upgrade(conn)`. Applied versions are recorded in `schema_migrations`, so
+running the migrator again only applies what is missing. A migration that
+rebuilds tables on SQLite sets `disable_foreign_keys = True`; SQLite only
+honours that pragma outside a transaction, so the runner toggles it.
+
+    python migrate.py            # apply pending migrations
+    python migrate.py current    # print the applied version
+"""
+import importlib
+import os
+import sys
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select
+from database import engine
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+version_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(255), nullable=False),
+    Column('applied_at', DateTime, default=datetime.utcnow)
+)
+
+
+def load_migrations():
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not filename.endswith(".py") or filename.startswith("_"):
+            continue
+        version, _, name = filename[:-3].partition("_")
+        module = importlib.import_module(f"migrations.{filename[:-3]}")
+        migrations.append((int(version), name, module))
+    return migrations
+
+
+def current_version(conn):
+    schema_migrations.create(conn, checkfirst=True)
+    return conn.execute(select(schema_migrations.c.version).order_by(schema_migrations.c.version.desc())).scalar() or 0
+
+
+def upgrade(bind=engine, target=None):
+    """Apply every pending migration up to `target` (default: latest), each in its own transaction."""
+    applied = []
+    for version, name, module in load_migrations():
+        if target is not None and version > target:
+            break
+        with bind.connect() as conn:
+            foreign_keys_off = getattr(module, "disable_foreign_keys", False) and conn.dialect.name == "sqlite"
+            if foreign_keys_off:
+                conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+                conn.commit()
+            try:
+                with conn.begin():
+                    if version <= current_version(conn):
+                        continue
+                    module.upgrade(conn)
+                    conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+            finally:
+                if foreign_keys_off:
+                    conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+                    conn.commit()
+        applied.append(version)
+        print(f"Applied migration {version:04d}_{name}")
+    return applied
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if command == "current":
+        with engine.begin() as conn:
+            print(current_version(conn))
+    elif command == "upgrade":
+        upgrade(target=int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    else:
+        sys.exit(f"Unknown command: {command}")
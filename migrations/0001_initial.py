@@ -0,0 +1,70 @@
+"""Baseline schema, as previously created by Base.metadata.create_all.
+
+The tables are declared here rather than taken from models.py so this
+migration keeps producing the original schema as the models evolve.
+Existing databases already have these tables and are left untouched.
+"""
+from datetime import datetime
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, MetaData, String, Table, Text
+
+metadata = MetaData()
+
+Table(
+    'users', metadata,
+    Column('id', String, primary_key=True),
+    Column('name', String(50), unique=True, index=True),
+    Column('email', String(255), unique=True, index=True),
+    Column('hashed_password', String(255), nullable=True),
+    Column('google_token', String(255), nullable=True),
+    Column('auth_type', String(20)),
+    Column('gender', String(10), nullable=True),
+    Column('DOB', DateTime, nullable=True),
+    Column('picture', String(255), nullable=True)
+)
+
+Table(
+    'projects', metadata,
+    Column('id', String, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('description', Text, nullable=True),
+    Column('finished', Boolean),
+    Column('priority', String(20)),
+    Column('date_start', DateTime, default=datetime.utcnow),
+    Column('date_end', DateTime, nullable=True),
+    Column('owner_id', String, ForeignKey('users.id'))
+)
+
+Table(
+    'tags', metadata,
+    Column('id', String, primary_key=True),
+    Column('name', String(50), nullable=False),
+    Column('color', String(50), nullable=False),
+    Column('project_id', String, ForeignKey('projects.id'))
+)
+
+Table(
+    'tasks', metadata,
+    Column('id', String, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('description', Text, nullable=True),
+    Column('finished', Boolean),
+    Column('date', DateTime),
+    Column('project_id', String, ForeignKey('projects.id')),
+    Column('tag_id', String, ForeignKey('tags.id'))
+)
+
+Table(
+    'user_tasks', metadata,
+    Column('user_id', String, ForeignKey('users.id'), primary_key=True),
+    Column('task_id', String, ForeignKey('tasks.id'), primary_key=True)
+)
+
+Table(
+    'user_projects', metadata,
+    Column('user_id', String, ForeignKey('users.id'), primary_key=True),
+    Column('project_id', String, ForeignKey('projects.id'), primary_key=True)
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
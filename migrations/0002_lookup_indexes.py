@@ -0,0 +1,21 @@
+"""Indexes for foreign keys, association-table reverse lookups and common filters.
+
+tasks.project_id and projects.owner_id are covered by the leading column of
+their composite indexes, so they get no single-column index of their own.
+"""
+from sqlalchemy import text
+
+INDEXES = [
+    ('ix_tasks_tag_id', 'tasks', 'tag_id'),
+    ('ix_tasks_date', 'tasks', 'date'),
+    ('ix_tasks_project_id_date', 'tasks', 'project_id, date'),
+    ('ix_tags_project_id', 'tags', 'project_id'),
+    ('ix_projects_owner_id_date_start', 'projects', 'owner_id, date_start'),
+    ('ix_user_tasks_task_id', 'user_tasks', 'task_id'),
+    ('ix_user_projects_project_id', 'user_projects', 'project_id'),
+]
+
+
+def upgrade(conn):
+    for name, table, columns in INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
@@ -0,0 +1,26 @@
+"""Outbox table for queued outgoing email."""
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, Text
+
+metadata = MetaData()
+
+Table(
+    'email_outbox', metadata,
+    Column('id', String, primary_key=True),
+    Column('sender', String(255), nullable=False),
+    Column('receiver', String(255), nullable=False),
+    Column('subject', String(255), nullable=False),
+    Column('message', Text, nullable=False),
+    Column('status', String(20), nullable=False),
+    Column('attempts', Integer, nullable=False),
+    Column('last_error', Text, nullable=True),
+    Column('claimed_by', String, nullable=True),
+    Column('next_attempt_at', DateTime, default=datetime.utcnow),
+    Column('created_at', DateTime, default=datetime.utcnow),
+    Column('sent_at', DateTime, nullable=True),
+    Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at')
+)
+
+
+def upgrade(conn):
+    metadata.create_all(conn, checkfirst=True)
@@ -0,0 +1,6 @@
+"""Per-project version counter, bumped by every mutation of a project's tree."""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("ALTER TABLE projects ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
@@ -0,0 +1,107 @@
+"""ON DELETE CASCADE from projects to their tasks, tags and assignments, and
+from tasks to their assignments, so a project or task is removed with one
+DELETE and leaves no orphaned user_tasks/user_projects rows.
+
+Postgres swaps the constraints in place. SQLite cannot alter a foreign key,
+so the affected tables are rebuilt from the definitions below.
+"""
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, MetaData, String, Table, Text, inspect, text
+from sqlalchemy.schema import CreateTable
+
+disable_foreign_keys = True
+
+CASCADES = [
+    ('tags', 'project_id', 'projects'),
+    ('tasks', 'project_id', 'projects'),
+    ('user_tasks', 'task_id', 'tasks'),
+    ('user_projects', 'project_id', 'projects'),
+]
+
+# Rows an earlier non-cascading delete left behind; they would fail the new constraints.
+ORPHANS = [
+    "DELETE FROM tags WHERE project_id IS NOT NULL AND project_id NOT IN (SELECT id FROM projects)",
+    "DELETE FROM tasks WHERE project_id IS NOT NULL AND project_id NOT IN (SELECT id FROM projects)",
+    "DELETE FROM user_tasks WHERE task_id NOT IN (SELECT id FROM tasks)",
+    "DELETE FROM user_projects WHERE project_id NOT IN (SELECT id FROM projects)",
+]
+
+metadata = MetaData()
+
+Table('users', metadata, Column('id', String, primary_key=True))
+Table('projects', metadata, Column('id', String, primary_key=True))
+
+Table(
+    'tags', metadata,
+    Column('id', String, primary_key=True),
+    Column('name', String(50), nullable=False),
+    Column('color', String(50), nullable=False),
+    Column('project_id', String, ForeignKey('projects.id', ondelete='CASCADE')),
+    Index('ix_tags_project_id', 'project_id')
+)
+
+Table(
+    'tasks', metadata,
+    Column('id', String, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('description', Text, nullable=True),
+    Column('finished', Boolean),
+    Column('date', DateTime),
+    Column('project_id', String, ForeignKey('projects.id', ondelete='CASCADE')),
+    Column('tag_id', String, ForeignKey('tags.id')),
+    Index('ix_tasks_tag_id', 'tag_id'),
+    Index('ix_tasks_date', 'date'),
+    Index('ix_tasks_project_id_date', 'project_id', 'date')
+)
+
+Table(
+    'user_tasks', metadata,
+    Column('user_id', String, ForeignKey('users.id'), primary_key=True),
+    Column('task_id', String, ForeignKey('tasks.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_user_tasks_task_id', 'task_id')
+)
+
+Table(
+    'user_projects', metadata,
+    Column('user_id', String, ForeignKey('users.id'), primary_key=True),
+    Column('project_id', String, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_user_projects_project_id', 'project_id')
+)
+
+
+def rebuild_sqlite_table(conn, table: Table):
+    """SQLite's documented table rebuild: copy into a new table, drop, rename, re-index."""
+    rebuilt = table.to_metadata(table.metadata, name=f"{table.name}__rebuilt")
+    rebuilt.indexes.clear()
+    table.metadata.remove(rebuilt)
+    columns = ", ".join(f'"{column.name}"' for column in table.columns)
+    conn.execute(CreateTable(rebuilt))
+    conn.execute(text(f"INSERT INTO {rebuilt.name} ({columns}) SELECT {columns} FROM {table.name}"))
+    conn.execute(text(f"DROP TABLE {table.name}"))
+    conn.execute(text(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}"))
+    for index in table.indexes:
+        index.create(conn)
+
+
+def replace_foreign_key(conn, table: str, column: str, referred_table: str):
+    for foreign_key in inspect(conn).get_foreign_keys(table):
+        if foreign_key["constrained_columns"] == [column]:
+            conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{foreign_key["name"]}"'))
+    conn.execute(text(
+        f"ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey "
+        f"FOREIGN KEY ({column}) REFERENCES {referred_table} (id) ON DELETE CASCADE"
+    ))
+
+
+def upgrade(conn):
+    for statement in ORPHANS:
+        conn.execute(text(statement))
+
+    if conn.dialect.name == "sqlite":
+        for name in ('tags', 'tasks', 'user_tasks', 'user_projects'):
+            rebuild_sqlite_table(conn, metadata.tables[name])
+        violations = conn.execute(text("PRAGMA foreign_key_check")).fetchall()
+        if violations:
+            raise RuntimeError(f"Foreign key violations after rebuild: {violations}")
+    else:
+        for table, column, referred_table in CASCADES:
+            replace_foreign_key(conn, table, column, referred_table)
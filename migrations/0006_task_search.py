@@ -0,0 +1,50 @@
+"""Full-text index over task names and descriptions.
+
+Postgres gets a stored, generated `tsvector` column (names weighted above
+descriptions) with a GIN index. SQLite, used for local runs, gets an FTS5
+table over the same columns, kept in sync by triggers. The FTS5 table is
+keyed by the rowid of tasks, so after a VACUUM rebuild it with
+`INSERT INTO tasks_fts(tasks_fts) VALUES('rebuild')`.
+"""
+from sqlalchemy import text
+
+POSTGRES = [
+    """
+    ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_tasks_search_vector ON tasks USING GIN (search_vector)",
+]
+
+SQLITE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        name, description, content='tasks', content_rowid='rowid', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, name, description) VALUES (new.rowid, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, name, description) VALUES ('delete', old.rowid, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF name, description ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, name, description) VALUES ('delete', old.rowid, old.name, old.description);
+        INSERT INTO tasks_fts(rowid, name, description) VALUES (new.rowid, new.name, new.description);
+    END
+    """,
+    "INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade(conn):
+    statements = {"postgresql": POSTGRES, "sqlite": SQLITE}.get(conn.dialect.name, [])
+    for statement in statements:
+        conn.execute(text(statement))
@@ -0,0 +1,48 @@
+"""Per-project task aggregates for the dashboard, backfilled from existing tasks."""
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, MetaData, String, Table, text
+
+metadata = MetaData()
+
+Table('projects', metadata, Column('id', String, primary_key=True))
+Table('tags', metadata, Column('id', String, primary_key=True))
+
+Table(
+    'project_stats', metadata,
+    Column('project_id', String, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True),
+    Column('total_tasks', Integer, nullable=False, server_default="0"),
+    Column('finished_tasks', Integer, nullable=False, server_default="0"),
+    Column('next_due_date', DateTime, nullable=True)
+)
+
+Table(
+    'project_tag_counts', metadata,
+    Column('project_id', String, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True),
+    Column('tag_id', String, ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    Column('task_count', Integer, nullable=False, server_default="0")
+)
+
+BACKFILL = [
+    """
+    INSERT INTO project_stats (project_id, total_tasks, finished_tasks, next_due_date)
+    SELECT projects.id,
+           count(tasks.id),
+           coalesce(sum(CASE WHEN tasks.finished THEN 1 ELSE 0 END), 0),
+           min(CASE WHEN NOT tasks.finished THEN tasks.date END)
+    FROM projects LEFT JOIN tasks ON tasks.project_id = projects.id
+    GROUP BY projects.id
+    """,
+    """
+    INSERT INTO project_tag_counts (project_id, tag_id, task_count)
+    SELECT project_id, tag_id, count(*)
+    FROM tasks
+    WHERE project_id IS NOT NULL AND tag_id IS NOT NULL
+    GROUP BY project_id, tag_id
+    """,
+]
+
+
+def upgrade(conn):
+    for name in ('project_stats', 'project_tag_counts'):
+        metadata.tables[name].create(conn, checkfirst=True)
+    for statement in BACKFILL:
+        conn.execute(text(statement))
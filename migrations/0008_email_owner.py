@@ -0,0 +1,6 @@
+"""Record who queued each outbox email so its status is only shown to them."""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text("ALTER TABLE email_outbox ADD COLUMN owner_id VARCHAR REFERENCES users (id) ON DELETE CASCADE"))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, ForeignKey, DateTime, Text, Boolean, Table, create_engine
+from sqlalchemy import Column, String, ForeignKey, DateTime, Text, Boolean, Integer, Table, Index, create_engine
 from sqlalchemy.orm import relationship, declarative_base, sessionmaker
 from datetime import datetime
 from uuid import uuid4
@@ -8,13 +8,15 @@ from database import Base
 user_tasks = Table(
     'user_tasks', Base.metadata,
     Column('user_id', String, ForeignKey('users.id'), primary_key=True),
-    Column('task_id', String, ForeignKey('tasks.id'), primary_key=True)
+    Column('task_id', String, ForeignKey('tasks.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_user_tasks_task_id', 'task_id')
 )
 
 user_projects = Table(
     'user_projects', Base.metadata,
     Column('user_id', String, ForeignKey('users.id'), primary_key=True),
-    Column('project_id', String, ForeignKey('projects.id'), primary_key=True)
+    Column('project_id', String, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_user_projects_project_id', 'project_id')
 )
 
 class User(Base):
@@ -36,6 +38,9 @@ class User(Base):
 
 class Project(Base):
     __tablename__ = 'projects'
+    __table_args__ = (
+        Index('ix_projects_owner_id_date_start', 'owner_id', 'date_start'),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
     name = Column(String(100), nullable=False)
@@ -44,30 +49,36 @@ class Project(Base):
     priority = Column(String(20))
     date_start = Column(DateTime, default=datetime.utcnow)
     date_end = Column(DateTime, nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     owner_id = Column(String, ForeignKey('users.id'))
     owner = relationship("User", back_populates="projects")
     
-    tasks = relationship("Task", back_populates="project")
-    tags = relationship("Tag", back_populates="project")
-    assignees = relationship("User", secondary=user_projects, back_populates="assigned_projects")
+    # Children are removed by the database's ON DELETE CASCADE, so the ORM
+    # never has to load them just to delete a project.
+    tasks = relationship("Task", back_populates="project", passive_deletes=True)
+    tags = relationship("Tag", back_populates="project", passive_deletes=True)
+    assignees = relationship("User", secondary=user_projects, back_populates="assigned_projects", passive_deletes=True)
 
 class Task(Base):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        Index('ix_tasks_project_id_date', 'project_id', 'date'),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
     name = Column(String(100), nullable=False)
     description = Column(Text, nullable=True)
     finished = Column(Boolean, default=False)
-    date = Column(DateTime, default=datetime.utcnow)
+    date = Column(DateTime, default=datetime.utcnow, index=True)
     
-    project_id = Column(String, ForeignKey('projects.id'))
+    project_id = Column(String, ForeignKey('projects.id', ondelete='CASCADE'))
     project = relationship("Project", back_populates="tasks")
     
-    tag_id = Column(String, ForeignKey('tags.id'))
+    tag_id = Column(String, ForeignKey('tags.id'), index=True)
     tag = relationship("Tag", back_populates="tasks")
     
-    assignees = relationship("User", secondary=user_tasks, back_populates="assigned_tasks")
+    assignees = relationship("User", secondary=user_tasks, back_populates="assigned_tasks", passive_deletes=True)
 
 class Tag(Base):
     __tablename__ = 'tags'
@@ -75,6 +86,42 @@ class Tag(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
     name = Column(String(50), nullable=False)
     color = Column(String(50), nullable=False)
-    project_id = Column(String, ForeignKey('projects.id'))
+    project_id = Column(String, ForeignKey('projects.id', ondelete='CASCADE'), index=True)
     project = relationship("Project", back_populates="tags")
     tasks = relationship("Task", back_populates="tag")
+
+class EmailOutbox(Base):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid4()))
+    owner_id = Column(String, ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
+    sender = Column(String(255), nullable=False)
+    receiver = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    message = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    claimed_by = Column(String, nullable=True)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+class ProjectStats(Base):
+    """Task counts and next due date per project, kept current by project_stats.py."""
+    __tablename__ = 'project_stats'
+
+    project_id = Column(String, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
+    total_tasks = Column(Integer, nullable=False, default=0, server_default="0")
+    finished_tasks = Column(Integer, nullable=False, default=0, server_default="0")
+    next_due_date = Column(DateTime, nullable=True)
+
+class ProjectTagCount(Base):
+    __tablename__ = 'project_tag_counts'
+
+    project_id = Column(String, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
+    tag_id = Column(String, ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True)
+    task_count = Column(Integer, nullable=False, default=0, server_default="0")
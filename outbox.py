@@ -0,0 +1,285 @@
+import os
+import smtplib
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from queue import Empty, LifoQueue
+from uuid import uuid4
+from sqlalchemy import and_, or_, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import EmailOutbox
+import schemas
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BACKOFF = float(os.getenv("EMAIL_RETRY_BACKOFF", "30"))
+EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", "10"))
+# How long a claimed message stays reserved; a sender that dies mid-batch
+# releases its messages to other senders once this lease runs out.
+EMAIL_CLAIM_LEASE = float(os.getenv("EMAIL_CLAIM_LEASE", "300"))
+
+
+def build_message(email: EmailOutbox):
+    msg = MIMEMultipart("alternative")
+    msg['From'] = email.sender
+    msg['To'] = email.receiver
+    msg['Subject'] = email.subject
+
+    plain_text = MIMEText(email.message, 'plain')
+    html_text = MIMEText(f"<html><body>{email.message}</body></html>", 'html')
+
+    msg.attach(plain_text)
+    msg.attach(html_text)
+    return msg
+
+
+class SMTPPool:
+    """A small pool of authenticated SMTP connections per login.
+
+    Connections are checked with NOOP before reuse and replaced when the
+    server has dropped them, so STARTTLS and login happen once per connection
+    rather than once per message.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, starttls=SMTP_STARTTLS, size=SMTP_POOL_SIZE, timeout=SMTP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.size = size
+        self.timeout = timeout
+        self._idle = defaultdict(LifoQueue)
+        self._lock = threading.Lock()
+
+    def _connect(self, login: str):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        password = os.getenv("EMAIL_PASSWORD")
+        if password:
+            server.login(login, password)
+        return server
+
+    def acquire(self, login: str):
+        with self._lock:
+            idle = self._idle[login]
+        while True:
+            try:
+                server = idle.get_nowait()
+            except Empty:
+                return self._connect(login)
+            try:
+                server.noop()
+                return server
+            except (smtplib.SMTPException, OSError):
+                self.discard(server)
+
+    def release(self, login: str, server):
+        with self._lock:
+            idle = self._idle[login]
+        if idle.qsize() < self.size:
+            idle.put(server)
+        else:
+            self.discard(server)
+
+    def discard(self, server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def close(self):
+        with self._lock:
+            queues = list(self._idle.values())
+            self._idle.clear()
+        for idle in queues:
+            while not idle.empty():
+                self.discard(idle.get_nowait())
+
+
+class EmailSender:
+    """Background delivery loop for the email outbox.
+
+    Each cycle claims up to `batch_size` due messages, groups them by sender
+    and delivers each group over one pooled connection, with up to
+    `pool.size` groups in flight. Failures are retried with exponential
+    backoff until `max_attempts`, after which the message is marked failed.
+    """
+
+    def __init__(self, pool: SMTPPool = None, batch_size=EMAIL_BATCH_SIZE, max_attempts=EMAIL_MAX_ATTEMPTS,
+                 backoff=EMAIL_RETRY_BACKOFF, poll_interval=EMAIL_POLL_INTERVAL, session_factory=SessionLocal):
+        self.pool = pool or SMTPPool()
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.session_factory = session_factory
+        self.worker_id = str(uuid4())
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Created by the first delivery, so a container that never sends mail
+        # never sets up SMTP workers.
+        self._executor = None
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.pool.size, thread_name_prefix="smtp")
+            return self._executor
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._loop, name="email-sender", daemon=True)
+                self._thread.start()
+
+    def notify(self):
+        self.start()
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.pool.close()
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            try:
+                delivered = self.run_once()
+            except Exception as e:
+                print(f"Email sender cycle failed: {e}")
+                delivered = 0
+            if delivered < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def claim(self, db: Session):
+        now = datetime.utcnow()
+        # The due check is repeated in the UPDATE: on Postgres a second worker
+        # that waited on the row lock re-evaluates only this WHERE, and must
+        # then skip rows the first worker just leased.
+        is_due = and_(
+            EmailOutbox.status.in_(("pending", "sending")),
+            or_(EmailOutbox.next_attempt_at <= now, EmailOutbox.next_attempt_at.is_(None))
+        )
+        due = (
+            db.query(EmailOutbox.id)
+            .filter(is_due)
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(self.batch_size)
+            .subquery()
+        )
+        claimed = db.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(due.select()), is_due)
+            .values(status="sending", claimed_by=self.worker_id, next_attempt_at=now + timedelta(seconds=EMAIL_CLAIM_LEASE))
+            .returning(EmailOutbox.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        db.commit()
+        if not claimed:
+            return []
+        # Only the rows this cycle leased: rows left `sending` by a failed
+        # cycle wait for their lease to run out like any other retry.
+        return db.query(EmailOutbox).filter(EmailOutbox.id.in_(claimed)).all()
+
+    def run_once(self):
+        """Claim and deliver one batch. Returns the number of messages claimed."""
+        db = self.session_factory()
+        try:
+            emails = self.claim(db)
+            by_sender = defaultdict(list)
+            for email in emails:
+                by_sender[email.sender].append(email)
+            executor = self.executor()
+            futures = [executor.submit(self._deliver, sender, batch) for sender, batch in by_sender.items()]
+            # Outcomes are applied here rather than in the SMTP threads, which
+            # must not touch the session.
+            for future in futures:
+                for email, error in future.result():
+                    self._record(email, error)
+            db.commit()
+            return len(emails)
+        finally:
+            db.close()
+
+    def _deliver(self, sender: str, emails):
+        results = []
+        server = None
+        for email in emails:
+            try:
+                if server is None:
+                    server = self.pool.acquire(sender)
+                server.sendmail(email.sender, email.receiver, build_message(email).as_string())
+                results.append((email, None))
+            except Exception as e:
+                if server is not None:
+                    self.pool.discard(server)
+                    server = None
+                results.append((email, str(e)))
+        if server is not None:
+            self.pool.release(sender, server)
+        return results
+
+    def _record(self, email: EmailOutbox, error):
+        email.attempts = (email.attempts or 0) + 1
+        email.claimed_by = None
+        email.last_error = error
+        if error is None:
+            email.status = "sent"
+            email.sent_at = datetime.utcnow()
+        elif email.attempts >= self.max_attempts:
+            email.status = "failed"
+        else:
+            email.status = "pending"
+            email.next_attempt_at = datetime.utcnow() + timedelta(seconds=self.backoff * (2 ** (email.attempts - 1)))
+
+
+email_sender = EmailSender()
+
+
+def enqueue_email(email: schemas.EmailSchema, owner_id: str, db: Session):
+    outbox_email = EmailOutbox(
+        id=str(uuid4()),
+        owner_id=owner_id,
+        sender=email.sender,
+        receiver=email.receiver,
+        subject=email.subject,
+        message=email.message,
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.add(outbox_email)
+    db.commit()
+    email_sender.notify()
+    return outbox_email
+
+
+def serialize_email(email: EmailOutbox):
+    return {
+        'id': email.id,
+        'receiver': email.receiver,
+        'subject': email.subject,
+        'status': email.status,
+        'attempts': email.attempts,
+        'last_error': email.last_error,
+        'created_at': email.created_at,
+        'sent_at': email.sent_at
+    }
@@ -0,0 +1,82 @@
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, Query
+from sqlalchemy import DateTime, and_, or_
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+
+def encode_cursor(sort_value, row_id: str):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return sort_value, row_id
+
+
+class PageParams:
+    """Query parameters for keyset pagination.
+
+    Pagination is only applied when the client sends `limit` or `cursor`, so
+    callers that never heard of it keep receiving the full list.
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None),
+    ):
+        self.enabled = limit is not None or cursor is not None
+        self.limit = limit or DEFAULT_PAGE_SIZE
+        self.after = None
+        if cursor:
+            try:
+                self.after = decode_cursor(cursor)
+            except (ValueError, TypeError):
+                raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def paginate(query, sort_column, id_column, page: PageParams):
+    """Apply a (sort_column, id) keyset window to `query`.
+
+    Rows are ordered ascending with NULL sort values last, so every page is a
+    bounded index range scan instead of an OFFSET skip. Returns the rows of the
+    page and the cursor for the next one (None on the last page).
+    """
+    if page.after is not None:
+        sort_value, row_id = page.after
+        if sort_value is not None and isinstance(sort_column.type, DateTime):
+            try:
+                sort_value = datetime.fromisoformat(sort_value)
+            except (ValueError, TypeError):
+                raise HTTPException(status_code=400, detail="Invalid cursor.")
+        if sort_value is None:
+            query = query.filter(and_(sort_column.is_(None), id_column > row_id))
+        else:
+            query = query.filter(or_(
+                sort_column > sort_value,
+                and_(sort_column == sort_value, id_column > row_id),
+                sort_column.is_(None),
+            ))
+
+    rows = query.order_by(sort_column.asc().nulls_last(), id_column.asc()).limit(page.limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
+
+
+def page_response(items, next_cursor):
+    return {"items": items, "next_cursor": next_cursor}
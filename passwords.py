@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "16"))
+
+# Pinning min and max to the configured cost makes passlib report any hash
+# made with a different cost as needing an update, in either direction.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class HashExecutor:
+    """Runs bcrypt on a dedicated, size-limited thread pool.
+
+    bcrypt is deliberately slow, so it is kept off the shared request
+    threadpool. At most `workers` hashes run at once and `max_queue` more
+    may wait; beyond that `HashingBusy` is raised immediately so a login burst
+    is turned away instead of tying up every request thread.
+    """
+
+    def __init__(self, context: CryptContext = pwd_context, workers: int = HASH_WORKERS, max_queue: int = HASH_MAX_QUEUE):
+        self.context = context
+        self.capacity = workers + max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._stats = {
+            "hash": {"count": 0, "latency_seconds": 0.0, "max_latency_seconds": 0.0},
+            "verify": {"count": 0, "latency_seconds": 0.0, "max_latency_seconds": 0.0},
+            "queue_wait_seconds": 0.0,
+            "max_queue_wait_seconds": 0.0,
+            "rejected": 0,
+        }
+
+    def _run(self, operation: str, fn, *args):
+        with self._lock:
+            if self._inflight >= self.capacity:
+                self._stats["rejected"] += 1
+                raise HashingBusy()
+            self._inflight += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            result = fn(*args)
+            return result, started - submitted, time.perf_counter() - started
+
+        try:
+            result, waited, took = self._executor.submit(timed).result()
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+        with self._lock:
+            stats = self._stats[operation]
+            stats["count"] += 1
+            stats["latency_seconds"] += took
+            stats["max_latency_seconds"] = max(stats["max_latency_seconds"], took)
+            self._stats["queue_wait_seconds"] += waited
+            self._stats["max_queue_wait_seconds"] = max(self._stats["max_queue_wait_seconds"], waited)
+        return result
+
+    def hash(self, password: str):
+        return self._run("hash", self.context.hash, password)
+
+    def verify_and_update(self, password: str, hashed_password: str):
+        """Return (valid, new_hash); new_hash is set when the stored cost differs from BCRYPT_ROUNDS."""
+        return self._run("verify", self.context.verify_and_update, password, hashed_password)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hash": dict(self._stats["hash"]),
+                "verify": dict(self._stats["verify"]),
+                "queue_wait_seconds": self._stats["queue_wait_seconds"],
+                "max_queue_wait_seconds": self._stats["max_queue_wait_seconds"],
+                "rejected": self._stats["rejected"],
+                "inflight": self._inflight,
+            }
+
+
+hash_executor = HashExecutor()
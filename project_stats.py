@@ -0,0 +1,237 @@
+"""Incrementally maintained per-project task aggregates.
+
+Every task mutation describes its effect with a `StatsDelta` and applies it
+in the same transaction. The dashboard therefore reads a handful of small
+rows per project instead of counting tasks. If the aggregates ever drift,
+repair them from the tasks table:
+
+    python project_stats.py verify            # list projects whose aggregates drifted
+    python project_stats.py verify --repair   # ... and rebuild those projects
+    python project_stats.py rebuild [id ...]  # rebuild everything, or the given projects
+"""
+import sys
+from collections import defaultdict
+from sqlalchemy import and_, case, delete, func, select
+from sqlalchemy.orm import Session
+from models import Project, ProjectStats, ProjectTagCount, Tag, Task
+
+
+def upsert_for(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def next_due_date(project_id: str):
+    # Walks ix_tasks_project_id_date from the earliest date to the first open task.
+    return select(func.min(Task.date)).where(Task.project_id == project_id, Task.finished == False).scalar_subquery()
+
+
+class StatsDelta:
+    """What a mutation did to one project's tasks, as counts to add."""
+
+    def __init__(self):
+        self.total = 0
+        self.finished = 0
+        self.tags = defaultdict(int)
+        self.due_changed = False
+
+    def __bool__(self):
+        return bool(self.total or self.finished or self.due_changed or any(self.tags.values()))
+
+    def add(self, tag_id, finished):
+        self.total += 1
+        self.finished += bool(finished)
+        if tag_id:
+            self.tags[tag_id] += 1
+        if not finished:
+            self.due_changed = True
+        return self
+
+    def remove(self, tag_id, finished):
+        self.total -= 1
+        self.finished -= bool(finished)
+        if tag_id:
+            self.tags[tag_id] -= 1
+        if not finished:
+            self.due_changed = True
+        return self
+
+    def change(self, old_tag_id, old_finished, new_tag_id, new_finished, date_changed=False):
+        self.finished += bool(new_finished) - bool(old_finished)
+        if old_tag_id != new_tag_id:
+            if old_tag_id:
+                self.tags[old_tag_id] -= 1
+            if new_tag_id:
+                self.tags[new_tag_id] += 1
+        if bool(old_finished) != bool(new_finished) or (date_changed and not new_finished):
+            self.due_changed = True
+        return self
+
+    def apply(self, project_id: str, db: Session):
+        """Write the delta in the caller's session and transaction, so it commits or rolls back with the mutation.
+
+        Pending ORM changes are flushed first so the due date sees them.
+        """
+        if project_id is None or not self:
+            return
+        db.flush()
+        insert = upsert_for(db)
+
+        stats = insert(ProjectStats).values(
+            project_id=project_id,
+            total_tasks=self.total,
+            finished_tasks=self.finished,
+            next_due_date=next_due_date(project_id) if self.due_changed else None
+        )
+        changes = {
+            'total_tasks': ProjectStats.total_tasks + self.total,
+            'finished_tasks': ProjectStats.finished_tasks + self.finished
+        }
+        if self.due_changed:
+            changes['next_due_date'] = stats.excluded.next_due_date
+        db.execute(stats.on_conflict_do_update(index_elements=[ProjectStats.project_id], set_=changes))
+
+        tag_rows = [{'project_id': project_id, 'tag_id': tag_id, 'task_count': count} for tag_id, count in self.tags.items() if count]
+        if tag_rows:
+            counts = insert(ProjectTagCount)
+            counts = counts.on_conflict_do_update(
+                index_elements=[ProjectTagCount.project_id, ProjectTagCount.tag_id],
+                set_={'task_count': ProjectTagCount.task_count + counts.excluded.task_count}
+            )
+            db.execute(counts, tag_rows)
+
+
+def expected_stats(project_ids=None):
+    query = (
+        select(
+            Project.id,
+            func.count(Task.id),
+            func.coalesce(func.sum(case((Task.finished == True, 1), else_=0)), 0),
+            func.min(case((Task.finished == False, Task.date)))
+        )
+        .outerjoin(Task, Task.project_id == Project.id)
+        .group_by(Project.id)
+    )
+    if project_ids is not None:
+        query = query.where(Project.id.in_(project_ids))
+    return query
+
+
+def expected_tag_counts(project_ids=None):
+    query = (
+        select(Task.project_id, Task.tag_id, func.count())
+        .where(Task.project_id.is_not(None), Task.tag_id.is_not(None))
+        .group_by(Task.project_id, Task.tag_id)
+    )
+    if project_ids is not None:
+        query = query.where(Task.project_id.in_(project_ids))
+    return query
+
+
+def rebuild(db: Session, project_ids=None):
+    """Recompute aggregates from the tasks table for every project, or the given ones."""
+    stats_filter = [ProjectStats.project_id.in_(project_ids)] if project_ids is not None else []
+    counts_filter = [ProjectTagCount.project_id.in_(project_ids)] if project_ids is not None else []
+    db.execute(delete(ProjectStats).where(*stats_filter))
+    db.execute(delete(ProjectTagCount).where(*counts_filter))
+    db.execute(ProjectStats.__table__.insert().from_select(
+        ['project_id', 'total_tasks', 'finished_tasks', 'next_due_date'], expected_stats(project_ids)
+    ))
+    db.execute(ProjectTagCount.__table__.insert().from_select(
+        ['project_id', 'tag_id', 'task_count'], expected_tag_counts(project_ids)
+    ))
+    db.commit()
+
+
+def verify(db: Session):
+    """Return {project_id: (stored, expected)} for every project whose aggregates drifted."""
+    expected = {row[0]: [tuple(row[1:]), {}] for row in db.execute(expected_stats())}
+    for project_id, tag_id, count in db.execute(expected_tag_counts()):
+        if project_id in expected:
+            expected[project_id][1][tag_id] = count
+
+    stored = defaultdict(lambda: [None, {}])
+    for row in db.execute(select(ProjectStats.project_id, ProjectStats.total_tasks, ProjectStats.finished_tasks, ProjectStats.next_due_date)):
+        stored[row[0]][0] = tuple(row[1:])
+    for project_id, tag_id, count in db.execute(select(ProjectTagCount.project_id, ProjectTagCount.tag_id, ProjectTagCount.task_count)):
+        if count:
+            stored[project_id][1][tag_id] = count
+
+    drift = {}
+    for project_id, wanted in expected.items():
+        # Projects get a stats row with their first task; until then the
+        # missing row stands for an empty project.
+        have = stored.get(project_id) or [(0, 0, None), {}]
+        if have[0] is None:
+            have[0] = (0, 0, None)
+        if list(have) != wanted:
+            drift[project_id] = (have, wanted)
+    return drift
+
+
+def dashboard(owner_id: str, db: Session):
+    """Summaries of every project `owner_id` owns, from one query over the aggregate tables."""
+    rows = db.execute(
+        select(
+            Project.id, Project.name, Project.priority, Project.finished, Project.date_start, Project.date_end, Project.version,
+            ProjectStats.total_tasks, ProjectStats.finished_tasks, ProjectStats.next_due_date,
+            Tag.id.label('tag_id'), Tag.name.label('tag_name'), Tag.color.label('tag_color'), ProjectTagCount.task_count
+        )
+        .outerjoin(ProjectStats, ProjectStats.project_id == Project.id)
+        .outerjoin(ProjectTagCount, and_(ProjectTagCount.project_id == Project.id, ProjectTagCount.task_count > 0))
+        .outerjoin(Tag, Tag.id == ProjectTagCount.tag_id)
+        .where(Project.owner_id == owner_id)
+        .order_by(Project.date_start, Project.id, Tag.name)
+    )
+
+    summaries = {}
+    for row in rows:
+        summary = summaries.get(row.id)
+        if summary is None:
+            total = row.total_tasks or 0
+            finished = row.finished_tasks or 0
+            summary = summaries[row.id] = {
+                'id': row.id,
+                'name': row.name,
+                'priority': row.priority,
+                'finished': row.finished,
+                'date_start': row.date_start,
+                'date_end': row.date_end,
+                'version': row.version,
+                'total_tasks': total,
+                'finished_tasks': finished,
+                'progress': finished / total if total else 0.0,
+                'next_due_date': row.next_due_date,
+                'tags': []
+            }
+        if row.tag_id is not None:
+            summary['tags'].append({'id': row.tag_id, 'name': row.tag_name, 'color': row.tag_color, 'task_count': row.task_count})
+    return list(summaries.values())
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    db = SessionLocal()
+    try:
+        if command == "verify":
+            drift = verify(db)
+            for project_id, (have, wanted) in drift.items():
+                print(f"{project_id}: stored {have}, expected {wanted}")
+            print(f"{len(drift)} project(s) drifted")
+            if drift and "--repair" in sys.argv[2:]:
+                rebuild(db, list(drift))
+                print("Rebuilt drifted projects")
+            elif drift:
+                sys.exit(1)
+        elif command == "rebuild":
+            rebuild(db, sys.argv[2:] or None)
+            print("Rebuilt project aggregates")
+        else:
+            sys.exit(f"Unknown command: {command}")
+    finally:
+        db.close()
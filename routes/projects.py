@@ -1,46 +1,92 @@
-from fastapi import APIRouter, Depends, HTTPException
-from routes.users import get_current_user
-from models import User, Project, Tag, Task
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, WebSocket, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Union
+from routes.users import get_current_user, get_current_user_async
+from models import User, Project
+from database import get_db, get_async_db, SessionLocal
+from jobs import job_queue, JobQueueFull, JobFailed
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import schemas
+from pydantic import ValidationError
 from uuid import uuid4
-from crud import organize_project, organize_projects
-from dotenv import load_dotenv
-from openai import OpenAI
+from crud import bulk_create_plan, organize_projects, organize_projects_page, get_project_version, get_project_versions, get_project_version_async, organize_project_async
+from changefeed import change_hub
+from project_stats import dashboard
+from conditional import conditional, make_etag
+from pagination import PageParams, page_response
 import os
+import asyncio
 import json
+import orjson
 import re
-from datetime import datetime
 
-load_dotenv()
+# The OpenAI SDK takes longer to import than the rest of the app together, so
+# the client is built when the first plan is generated, not at startup.
+client = None
 
-client = OpenAI(api_key=os.getenv("my_api_key"))
+def get_openai_client():
+    global client
+    if client is None:
+        from openai import OpenAI
+
+        client = OpenAI(api_key=os.getenv("my_api_key"))
+    return client
+
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "120"))
 
 projects_routes = APIRouter()
 
-@projects_routes.get("/get_projects")
-def get_projects(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@projects_routes.get("/get_projects", response_model=Union[List[schemas.ProjectOut], schemas.ProjectPage])
+def get_projects(request: Request, response: Response, page: PageParams = Depends(), user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Invalid user credentials.")
     
+    versions = get_project_versions(db=db, owner_id=user.id)
+    etag = make_etag("projects", user.id, request.url.query, *(f"{id}:{version}" for id, version in versions))
+    not_modified = conditional(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    if page.enabled:
+        return page_response(*organize_projects_page(db=db, owner_id=user.id, page=page))
+
     projects = organize_projects(db=db, owner_id=user.id)
 
     return projects
 
-@projects_routes.get("/get_project/{project_id}")
-def get_project(project_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@projects_routes.get("/dashboard", response_model=List[schemas.ProjectSummary])
+def get_dashboard(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    if not user:
+        raise HTTPException(status_code=404, detail="Invalid user credentials.")
+
+    return dashboard(owner_id=user.id, db=db)
+
+@projects_routes.get("/get_project/{project_id}", response_model=schemas.ProjectOut)
+async def get_project(project_id: str, request: Request, response: Response, user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    # Served on the async engine: the worker keeps handling other requests
+    # while this one waits on the database, instead of holding a thread.
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized Access.")
     
-    project = db.query(Project).filter(Project.id == project_id).first()
+    version = await get_project_version_async(db=db, project_id=project_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Project not found.")
+
+    not_modified = conditional(request, response, make_etag("project", project_id, version))
+    if not_modified:
+        return not_modified
+
+    project = await organize_project_async(db=db, project_id=project_id)
 
     if project:
-        return organize_project(db=db, project_id=project_id)
+        return project
 
     raise HTTPException(status_code=404, detail="Project not found.")
 
-@projects_routes.post("/create_project")
+@projects_routes.post("/create_project", response_model=schemas.ProjectRecord)
 def create_project(project: schemas.ProjectCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Invalid user credentials.")
@@ -63,16 +109,6 @@ def create_project(project: schemas.ProjectCreate, user: User = Depends(get_curr
     db.refresh(db_project)
     return db_project
 
-def extract_tags(tasks):
-    unique_tags = {}
-    for task in tasks:
-        tag = task.get("tag")
-        if tag:
-            name = tag.get("name")
-            if name not in unique_tags:
-                unique_tags[name] = tag
-    return list(unique_tags.values())
-
 def generate_prompt(description, start_date, end_date, priority, project_id, assignee_id):
     prompt = f"""
     Hello, I need your help in generating a schedule for my project. Here is the description of the project: {description}.
@@ -96,61 +132,55 @@ def generate_prompt(description, start_date, end_date, priority, project_id, ass
     return prompt
 
 def generate_tasks(prompt):
-    response = client.chat.completions.create(
+    response = get_openai_client().chat.completions.create(
       model="gpt-4",  
       messages=[
           {"role": "system", "content": "You are a helpful assistant that aids in planning projects."},
           {"role": "user", "content": prompt}
-      ]
+      ],
+      timeout=AI_REQUEST_TIMEOUT
     )
     return response.choices[0].message.content
 
 def create_tasks(description, start_date, end_date, priority, project_id, assignee_id, db: Session):
     prompt = generate_prompt(description, start_date, end_date, priority, project_id, assignee_id)
     data = generate_tasks(prompt)
-    try:
-        tasks_json_match = re.search(r'\[\s*{.*}\s*\]', data, re.DOTALL)
+    return save_generated_tasks(data, project_id, assignee_id, db)
 
-        if not tasks_json_match:
-            return {"message": "Invalid response format"}
+def save_generated_tasks(data, project_id, assignee_id, db: Session):
+    tasks_json_match = re.search(r'\[\s*{.*}\s*\]', data, re.DOTALL)
 
-        tasks_json = tasks_json_match.group().strip()
+    if not tasks_json_match:
+        return {"message": "Invalid response format"}
 
-        try:
-            tasks = json.loads(tasks_json)
-            tags = extract_tags(tasks)
-            for tag_data in tags:
-                tag = Tag(
-                    id=tag_data["id"],
-                    name=tag_data["name"],
-                    color=tag_data["color"],
-                    project_id=tag_data["project_id"]
-                )
-                db.add(tag)
-            for task_data in tasks:
-                task_date = datetime.fromisoformat(task_data["date"])
-                task = Task(
-                    id=task_data["id"],
-                    name=task_data["name"],
-                    tag_id=task_data["tag_id"],
-                    project_id=task_data["project_id"],
-                    assignee_id=task_data["assignee_id"],
-                    description=task_data["description"],
-                    finished=task_data["finished"],
-                    date=task_date
-                )
-                db.add(task)
-            db.commit()
-            return
-        
-        except json.JSONDecodeError as e:
-            return {'message': f"JSON decoding error: {e}"}
+    tasks_json = tasks_json_match.group().strip()
+
+    try:
+        plan = schemas.GeneratedPlan(tasks=json.loads(tasks_json))
+    except json.JSONDecodeError as e:
+        return {'message': f"JSON decoding error: {e}"}
+    except ValidationError as e:
+        return {'message': f"Invalid generated plan: {e}"}
 
+    try:
+        task_ids, version = bulk_create_plan(project_id, assignee_id, plan, db)
     except Exception as e:
         print(str(e))
+        return {'message': str(e)}
+    change_hub.publish(project_id, version, "tasks.generated", {"task_ids": task_ids, "assignee_id": assignee_id})
+
+def generate_project_job(description, start_date, end_date, priority, project_id, assignee_id):
+    db = SessionLocal()
+    try:
+        error = create_tasks(description, start_date, end_date, priority, project_id, assignee_id, db=db)
+        if error:
+            raise JobFailed(error["message"])
+        return {"project_id": project_id}
+    finally:
+        db.close()
 
-@projects_routes.post("/create_project/ai")
-async def create_project_ai(project: schemas.ProjectCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@projects_routes.post("/create_project/ai", status_code=202)
+def create_project_ai(project: schemas.ProjectCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     project_id = str(uuid4())
 
     db_project = Project(
@@ -166,21 +196,116 @@ async def create_project_ai(project: schemas.ProjectCreate, user: User = Depends
     db_project.assignees.append(user)  # Assign the project to the creator by default
     db.add(db_project)
     db.commit()
-    db.refresh(db_project)
-    create_tasks(project.description, project.date_start, project.date_end, project.priority, project_id, user.id, db=db)
 
-    organised_project = organize_projects(db=db, owner_id=user.id)
-    return organised_project
+    # The GPT call takes tens of seconds, so it runs on the job pool and the
+    # client polls /jobs/{job_id}.
+    try:
+        job = job_queue.submit(
+            "create_project_ai", user.id, generate_project_job,
+            project.description, project.date_start, project.date_end, project.priority, project_id, user.id
+        )
+    except JobQueueFull:
+        # The job reads the project from its own session, so the project had to
+        # be committed first; take it back rather than leave an empty project
+        # behind for every retry.
+        db.execute(delete(Project).where(Project.id == project_id))
+        db.commit()
+        raise HTTPException(status_code=429, detail="Too many project generations in progress, try again later.")
+
+    return {**job.to_dict(), "project_id": project_id}
+
+@projects_routes.get("/jobs/{job_id}")
+def get_job(job_id: str, user: User = Depends(get_current_user)):
+    job = job_queue.get(job_id)
+    if not job or job.owner_id != user.id:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job.to_dict()
 
 @projects_routes.delete("/delete_project/{project_id}")
 def delete_project(project_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Invalid user credentials")
     
-    project = db.query(Project).filter(Project.id == project_id).first()
-    db.query(Task).filter(Task.project_id == project_id).delete(synchronize_session=False)
-    db.query(Tag).filter(Tag.project_id == project_id).delete(synchronize_session=False)
-
-    db.delete(project)
+    # Tasks, tags and assignments are removed by ON DELETE CASCADE, so this is
+    # one statement however large the project is.
+    deleted = db.execute(delete(Project).where(Project.id == project_id).returning(Project.version)).first()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Project not found.")
     db.commit()
-    return {"message": "Successfully deleted the project."}
\ No newline at end of file
+    change_hub.publish(project_id, deleted.version + 1, "project.deleted", {"id": project_id})
+    return {"message": "Successfully deleted the project."}
+
+def open_feed(project_id: str, token: str):
+    """Authenticate a change-feed client and read the project's current version."""
+    db = SessionLocal()
+    try:
+        get_current_user(token=token, db=db)
+        version = get_project_version(project_id=project_id, db=db)
+    finally:
+        db.close()
+    if version is None:
+        raise HTTPException(status_code=404, detail="Project not found.")
+    return version
+
+def feed_token(connection, token: Optional[str]):
+    # Browsers cannot set headers on EventSource or WebSocket, so the token may
+    # also come as ?token=.
+    scheme, _, credentials = connection.headers.get("Authorization", "").partition(" ")
+    return token or (credentials if scheme.lower() == "bearer" else None)
+
+def sse_message(event):
+    if event is None:
+        return b": keepalive\n\n"
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (event["version"], event["type"].encode(), orjson.dumps(event))
+
+@projects_routes.get("/watch_project/{project_id}")
+async def watch_project(project_id: str, request: Request, since: Optional[int] = None, token: Optional[str] = None):
+    """Server-sent events for a project's committed changes.
+
+    Resumes after `since`, or after the standard Last-Event-ID header the
+    browser sends when it reconnects.
+    """
+    version = await run_in_threadpool(open_feed, project_id, feed_token(request, token))
+    last_event_id = request.headers.get("Last-Event-ID")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    subscription = change_hub.subscribe(project_id, version, since)
+
+    async def stream():
+        try:
+            yield b"retry: 2000\n\n"
+            async for event in subscription.events():
+                yield sse_message(event)
+        finally:
+            change_hub.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@projects_routes.websocket("/watch_project/{project_id}")
+async def watch_project_ws(websocket: WebSocket, project_id: str, since: Optional[int] = None, token: Optional[str] = None):
+    """The same feed over a WebSocket; heartbeats are sent as {"type": "heartbeat"}."""
+    try:
+        version = await run_in_threadpool(open_feed, project_id, feed_token(websocket, token))
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+    await websocket.accept()
+    subscription = change_hub.subscribe(project_id, version, since)
+
+    async def pump():
+        async for event in subscription.events():
+            await websocket.send_text(orjson.dumps(event or {"type": "heartbeat", "version": subscription.version}).decode())
+
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    sender = asyncio.ensure_future(pump())
+    receiver = asyncio.ensure_future(wait_for_disconnect())
+    done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    change_hub.unsubscribe(subscription)
+    if sender in done and sender.exception() is None:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER if subscription.overflowed else status.WS_1000_NORMAL_CLOSURE)
\ No newline at end of file
@@ -1,32 +1,89 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from typing import List, Optional, Union
+from datetime import datetime
 from database import get_db
 from models import User, Project, Tag, Task
 import schemas
 from sqlalchemy.orm import Session
 from routes.users import get_current_user
 from uuid import uuid4
-from crud import organize_tasks, organize_project, organize_task, create_tag
+import os
+from fastapi.responses import JSONResponse
+from crud import organize_tasks, organize_tasks_page, organize_project, organize_task, create_tag, bump_project_version, get_project_version, delete_task_row, apply_task_operations, calendar_tasks
+from conditional import conditional, make_etag
+from pagination import PageParams, page_response, paginate
+from changefeed import change_hub
+from search import search_tasks
+from project_stats import StatsDelta
 
 tasks_routes = APIRouter()
 
-@tasks_routes.get("/get_tasks/{project_id}")
-def get_tasks(project_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+BULK_MAX_OPERATIONS = int(os.getenv("BULK_MAX_OPERATIONS", "500"))
+CALENDAR_MAX_DAYS = int(os.getenv("CALENDAR_MAX_DAYS", "62"))
+
+@tasks_routes.get("/get_tasks/{project_id}", response_model=Union[List[schemas.TaskOut], schemas.TaskPage])
+def get_tasks(project_id: str, request: Request, response: Response, page: PageParams = Depends(), user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Invalid user credentials.")
     
+    version = get_project_version(db=db, project_id=project_id)
+    not_modified = conditional(request, response, make_etag("tasks", project_id, request.url.query, version))
+    if not_modified:
+        return not_modified
+
+    if page.enabled:
+        return page_response(*organize_tasks_page(db=db, project_id=project_id, page=page))
+
     tasks_with_tags = organize_tasks(db=db, project_id=project_id)
     return tasks_with_tags
 
-@tasks_routes.get("/assigned_tasks")
-def get_assigned_tasks(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@tasks_routes.get("/search_tasks/{project_id}", response_model=schemas.TaskPage)
+def search_project_tasks(project_id: str, request: Request, response: Response, q: Optional[str] = None, tag_id: Optional[str] = None,
+                         finished: Optional[bool] = None, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                         assignee_id: Optional[str] = None, page: PageParams = Depends(), user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    if not user:
+        raise HTTPException(status_code=404, detail="Invalid user credentials.")
+
+    version = get_project_version(db=db, project_id=project_id)
+    not_modified = conditional(request, response, make_etag("search", project_id, request.url.query, version))
+    if not_modified:
+        return not_modified
+
+    if date_to is not None and len(request.query_params["date_to"]) == len("YYYY-MM-DD"):
+        # A bare date is parsed as its midnight; the caller means the whole day.
+        date_to = date_to.date()
+
+    return page_response(*search_tasks(
+        db, project_id, page, q=q, tag_id=tag_id, finished=finished,
+        date_from=date_from, date_to=date_to, assignee_id=assignee_id
+    ))
+
+@tasks_routes.get("/assigned_tasks", response_model=Union[List[schemas.TaskRecord], schemas.TaskRecordPage])
+def get_assigned_tasks(page: PageParams = Depends(), user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Invalid user credentials.")
     
-    tasks = db.query(Task).join(Task.assignees).filter(User.id == user.id).all()
+    query = db.query(Task).join(Task.assignees).filter(User.id == user.id)
+    if page.enabled:
+        return page_response(*paginate(query, Task.date, Task.id, page))
+
+    tasks = query.all()
     return tasks
 
-@tasks_routes.post("/create_task/{project_id}")
-def create_task(project_id: str, task: schemas.TaskCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@tasks_routes.get("/calendar", response_model=List[schemas.CalendarTask])
+def get_calendar(start: datetime, end: datetime, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """The user's assigned tasks across all projects dated from `start` up to, not including, `end`."""
+    if not user:
+        raise HTTPException(status_code=404, detail="Invalid user credentials.")
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start.")
+    if (end - start).days > CALENDAR_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"The window may span at most {CALENDAR_MAX_DAYS} days.")
+
+    return calendar_tasks(user_id=user.id, start=start, end=end, db=db)
+
+@tasks_routes.post("/create_task/{project_id}", response_model=Union[schemas.TaskOut, schemas.TaskDelta])
+def create_task(project_id: str, task: schemas.TaskCreate, mode: schemas.ResponseMode = schemas.ResponseMode.full, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Invalid user credentials.")
     
@@ -34,6 +91,8 @@ def create_task(project_id: str, task: schemas.TaskCreate, user: User = Depends(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found.")
     
+    # Read now; committing expires the user.
+    assignee = {'id': user.id, 'name': user.name}
     task_id = str(uuid4())
     tag_id = create_tag(project_id=project_id, db=db, tag_name=task.tag_name, tag_color=task.tag_color)
 
@@ -49,11 +108,27 @@ def create_task(project_id: str, task: schemas.TaskCreate, user: User = Depends(
     task_model.assignees.append(user)  # Assign the task to the user by default
 
     db.add(task_model)
+    StatsDelta().add(tag_id, False).apply(project_id, db)
+    version = bump_project_version(project_id, db)
     db.commit()
+
+    changes = {
+        'name': task.name,
+        'description': task.description,
+        'date': task.date,
+        'finished': False,
+        'assignees': [assignee],
+        'tag': {'id': tag_id, 'name': task.tag_name, 'color': task.tag_color}
+    }
+    change_hub.publish(project_id, version, "task.created", {"id": task_id, **changes})
+
+    if mode == schemas.ResponseMode.minimal:
+        return {"id": task_id, "project_id": project_id, "version": version, "changes": changes}
+
     return organize_task(task_id=task_id, db=db)
 
-@tasks_routes.put("/edit_task/{task_id}")
-def edit_task(task_id: str, task_update: schemas.TaskUpdate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@tasks_routes.put("/edit_task/{task_id}", response_model=Union[schemas.TaskOut, schemas.TaskDelta])
+def edit_task(task_id: str, task_update: schemas.TaskUpdate, mode: schemas.ResponseMode = schemas.ResponseMode.full, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Not Authenticated.")
     
@@ -61,13 +136,22 @@ def edit_task(task_id: str, task_update: schemas.TaskUpdate, user: User = Depend
     if not task:
         raise HTTPException(status_code=404, detail="Task not found.")
     
-    for key, value in task_update.model_dump(exclude_unset=True).items():
+    changes = task_update.model_dump(exclude_unset=True)
+    old_tag_id, old_finished, old_date = task.tag_id, task.finished, task.date
+    for key, value in changes.items():
         setattr(task, key, value)
+    project_id = task.project_id
+    StatsDelta().change(old_tag_id, old_finished, task.tag_id, task.finished, task.date != old_date).apply(project_id, db)
+    version = bump_project_version(project_id, db)
     db.commit()
-    db.refresh(task)
+    change_hub.publish(project_id, version, "task.updated", {"id": task_id, **changes})
+
+    if mode == schemas.ResponseMode.minimal:
+        return {"id": task_id, "project_id": project_id, "version": version, "changes": changes}
+
     return organize_task(db=db, task_id=task_id)
 
-@tasks_routes.post("/add_task_tag/{task_id}/{tag_id}")
+@tasks_routes.post("/add_task_tag/{task_id}/{tag_id}", response_model=schemas.TaskRecord)
 def add_tag_to_task(tag_id: str, task_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Unauthorized Access.")
@@ -80,12 +164,17 @@ def add_tag_to_task(tag_id: str, task_id: str, user: User = Depends(get_current_
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found.")
 
+    StatsDelta().change(task.tag_id, task.finished, tag_id, task.finished).apply(task.project_id, db)
     task.tag_id = tag_id
+    project_id = task.project_id
+    changes = {'tag_id': tag_id, 'tag': {'id': tag.id, 'name': tag.name, 'color': tag.color}}
+    version = bump_project_version(project_id, db)
     db.commit()
+    change_hub.publish(project_id, version, "task.updated", {"id": task_id, **changes})
     db.refresh(task)
     return task
 
-@tasks_routes.get("/get_tags/{project_id}")
+@tasks_routes.get("/get_tags/{project_id}", response_model=List[schemas.TagOut])
 def get_tags(project_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Not Authenticated.")
@@ -93,7 +182,7 @@ def get_tags(project_id: str, user: User = Depends(get_current_user), db: Sessio
     tags = db.query(Tag).filter(Tag.project_id == project_id).all()
     return tags
 
-@tasks_routes.post("/create_tag/{task_id}")
+@tasks_routes.post("/create_tag/{task_id}", response_model=schemas.TagOut)
 def create_tag_for_task(tag: schemas.TagCreate, task_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Not Authenticated.")
@@ -103,22 +192,53 @@ def create_tag_for_task(tag: schemas.TagCreate, task_id: str, user: User = Depen
         raise HTTPException(status_code=404, detail="Task not found.")
 
     tag_id = str(uuid4())
-    tag_model = Tag(id=tag_id, name=tag.name, color=tag.color, project_id=task.project_id)
+    project_id = task.project_id
+    tag_model = Tag(id=tag_id, name=tag.name, color=tag.color, project_id=project_id)
     db.add(tag_model)
+    version = bump_project_version(project_id, db)
     db.commit()
+    change_hub.publish(project_id, version, "tag.created", {"id": tag_id, "name": tag.name, "color": tag.color, "project_id": project_id})
     return tag_model
 
-@tasks_routes.delete("/delete_task/{task_id}")
-def delete_task(task_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@tasks_routes.delete("/delete_task/{task_id}", response_model=Union[schemas.ProjectOut, schemas.DeletedTask])
+def delete_task(task_id: str, mode: schemas.ResponseMode = schemas.ResponseMode.full, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Not Authenticated.")
     
-    task = db.query(Task).filter(Task.id == task_id).first()
-    if not task:
+    deleted = delete_task_row(task_id=task_id, db=db)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Task not found.")
 
-    db.delete(task)
+    project_id = deleted.project_id
+    StatsDelta().remove(deleted.tag_id, deleted.finished).apply(project_id, db)
+    version = bump_project_version(project_id, db)
     db.commit()
+    change_hub.publish(project_id, version, "task.deleted", {"id": task_id})
+
+    if mode == schemas.ResponseMode.minimal:
+        return {"id": task_id, "project_id": project_id, "version": version}
+
+    project = organize_project(db=db, project_id=project_id)
+    return project
 
-    project = organize_project(db=db, project_id=task.project_id)
-    return project
\ No newline at end of file
+@tasks_routes.post("/bulk_tasks/{project_id}", response_model=schemas.BulkTaskResponse)
+def bulk_tasks(project_id: str, batch: schemas.BulkTaskRequest, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    if not user:
+        raise HTTPException(status_code=404, detail="Not Authenticated.")
+    if len(batch.operations) > BULK_MAX_OPERATIONS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_OPERATIONS} operations per batch.")
+
+    version = get_project_version(db=db, project_id=project_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Project not found.")
+    if not batch.operations:
+        return {"project_id": project_id, "version": version, "results": []}
+
+    results, changes, version = apply_task_operations(project_id, user.id, batch.operations, db)
+    if version is None:
+        db.rollback()
+        return JSONResponse(status_code=422, content={"project_id": project_id, "version": None, "results": results})
+
+    db.commit()
+    change_hub.publish(project_id, version, "tasks.bulk", changes)
+    return {"project_id": project_id, "version": version, "results": results}
@@ -1,58 +1,59 @@
 from fastapi import APIRouter, Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from passlib.context import CryptContext
 from uuid import uuid4
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from jwt_handler import jwt_decode
 import schemas
 from jwt_handler import sign_jwt
 from google_verify import verify_google_token
-from models import User, Task, Project
-from database import get_db
-from dotenv import load_dotenv
+from models import User, Task, Project, EmailOutbox
+from database import get_db, get_async_db
+from principal_cache import principal_cache
+from crud import organize_users, user_directory_query, iter_users, bump_user_project_versions
+from changefeed import change_hub
+from pagination import PageParams, page_response, paginate
 import os
-import smtplib
-from fastapi.responses import JSONResponse
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-
-load_dotenv()
+import orjson
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Union
+from outbox import enqueue_email, serialize_email
+from passwords import hash_executor, HashingBusy
 
 users_routes = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth_token")
 
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
-
-@users_routes.post("/send_email")
-async def send_in_background(email: schemas.EmailSchema):
-    try:
-        msg = MIMEMultipart("alternative")
-        msg['From'] = email.sender
-        msg['To'] = email.receiver
-        msg['Subject'] = email.subject
-
-        plain_text = MIMEText(email.message, 'plain')
-        html_text = MIMEText(f"<html><body>{email.message}</body></html>", 'html')
+USERS_BATCH_SIZE = int(os.getenv("USERS_BATCH_SIZE", "500"))
 
-        msg.attach(plain_text)
-        msg.attach(html_text)
-
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(email.sender, EMAIL_PASSWORD)
-        server.sendmail(email.sender, email.receiver, msg.as_string())
-        server.quit()
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    auth_token = jwt_decode(token)
 
-        print(f"Email sent to {email.receiver}")
+    if not auth_token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    user = principal_cache.get(auth_token.get("user_id"), auth_token["email"], db)
+    if user is not None:
+        return user
 
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+    user = db.query(User).filter(User.email == auth_token["email"]).first()
 
-    return JSONResponse(status_code=200, content={"message": "Email has been sent"})
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    principal_cache.put(user)
+    return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """get_current_user for `async def` routes, on the async session."""
     auth_token = jwt_decode(token)
 
     if not auth_token:
@@ -61,8 +62,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    user = db.query(User).filter(User.email == auth_token["email"]).first()
+
+    # A cache hit is attached with merge(load=False), which emits no SQL.
+    user = principal_cache.get(auth_token.get("user_id"), auth_token["email"], db.sync_session)
+    if user is not None:
+        return user
+
+    user = await db.scalar(select(User).where(User.email == auth_token["email"]))
 
     if user is None:
         raise HTTPException(
@@ -70,12 +76,38 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    principal_cache.put(user)
     return user
 
-def verify_password(plain_password, hashed_password, user_id, email):
-    if not pwd_context.verify(plain_password, hashed_password):
+@users_routes.post("/send_email")
+def send_in_background(email: schemas.EmailSchema, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    queued = enqueue_email(email, user.id, db)
+    return JSONResponse(status_code=202, content={"message": "Email has been queued", "id": queued.id, "status": queued.status})
+
+@users_routes.get("/emails/{email_id}")
+def get_email_status(email_id: str, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    email = db.query(EmailOutbox).filter(EmailOutbox.id == email_id, EmailOutbox.owner_id == user.id).first()
+    if not email:
+        raise HTTPException(status_code=404, detail="Email not found.")
+    return serialize_email(email)
+
+def hashing_busy():
+    return HTTPException(status_code=503, detail="Server busy, try again shortly.", headers={"Retry-After": "1"})
+
+def verify_password(plain_password, user_model: User, db: Session):
+    if not user_model.hashed_password:
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
+    try:
+        valid, new_hash = hash_executor.verify_and_update(plain_password, user_model.hashed_password)
+    except HashingBusy:
+        raise hashing_busy()
+    if not valid:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    return sign_jwt(user_id, email)
+    if new_hash:
+        # The configured bcrypt cost changed since this hash was made.
+        user_model.hashed_password = new_hash
+        db.commit()
+    return sign_jwt(user_model.id, user_model.email)
 
 @users_routes.post("/signup/normal")
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
@@ -86,7 +118,12 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     if check_user:
         raise HTTPException(status_code=500, detail="Email already in use.") 
 
-    db_user = User(id=user_id, name=user.name, email=user.email, hashed_password=pwd_context.hash(user.password), auth_type="normal")
+    try:
+        hashed_password = hash_executor.hash(user.password)
+    except HashingBusy:
+        raise hashing_busy()
+
+    db_user = User(id=user_id, name=user.name, email=user.email, hashed_password=hashed_password, auth_type="normal")
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
@@ -119,43 +156,31 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
     
     if not user_model:
         return HTTPException(status_code=400, detail="Incorrect email or password")
-    return verify_password(user.password, user_model.hashed_password, user_model.id, user_model.email)
-
-@users_routes.get("/users")
-def get_users(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    users = db.query(User).all()
-    users_with_projects = []
-
-    for user in users:
-        projects = []
-        for project in user.assigned_projects:
-            projects.append({
-                'id': project.id,
-                'name': project.name
-            })
-
-        tasks = []
-        for task in user.assigned_tasks:
-            tasks.append({
-                'id': task.id,
-                'name': task.name
-            })
-
-        user_data = {
-            'name': user.name,
-            'id': user.id,
-            'email': user.email,
-            'gender': user.gender,
-            'DOB': user.DOB,
-            'picture': user.picture,
-            'projects': projects if projects else None,
-            'tasks': tasks if tasks else None
-        }
-        users_with_projects.append(user_data)
-
-    return users_with_projects
-
-@users_routes.get("/user_details", response_model=schemas.UserResponse)
+    return verify_password(user.password, user_model, db)
+
+@users_routes.get("/users", response_model=Union[List[schemas.UserDirectoryEntry], schemas.UserDirectoryPage])
+def get_users(stream: bool = False, page: PageParams = Depends(), user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    if stream:
+        return StreamingResponse(stream_users(db.get_bind()), media_type="application/x-ndjson")
+
+    if page.enabled:
+        rows, next_cursor = paginate(user_directory_query(db), User.name, User.id, page)
+        return page_response(organize_users(rows, db), next_cursor)
+
+    return list(iter_users(db, USERS_BATCH_SIZE))
+
+def stream_users(bind):
+    # The request's session is closed once the handler returns, so the stream
+    # owns its own session for as long as the client keeps reading, on the
+    # same primary or replica the request was routed to.
+    db = Session(bind=bind, autoflush=False)
+    try:
+        for user_data in iter_users(db, USERS_BATCH_SIZE):
+            yield orjson.dumps(user_data) + b"\n"
+    finally:
+        db.close()
+
+@users_routes.get("/user_details", response_model=schemas.UserDetails)
 def get_user_details(user: User = Depends(get_current_user)):
     projects = [{'id': project.id, 'name': project.name} for project in user.assigned_projects]
     tasks = [{'id': task.id, 'name': task.name} for task in user.assigned_tasks]
@@ -172,14 +197,21 @@ def get_user_details(user: User = Depends(get_current_user)):
     }
     return user_dict
 
-@users_routes.put("/users/{user_id}")
+@users_routes.put("/users/{user_id}", response_model=schemas.UserResponse)
 def update_user(user_update: schemas.UserUpdate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found or no permission")
     
-    for key, value in user_update.model_dump(exclude_unset=True).items():
+    changes = user_update.model_dump(exclude_unset=True)
+    for key, value in changes.items():
         setattr(user, key, value)
+    # Project and task responses embed user names, so a rename has to change
+    # the ETags of every project that shows this user.
+    renamed = bump_user_project_versions(user.id, db) if "name" in changes else []
     db.commit()
+    principal_cache.invalidate(user.id)
+    for project_id, version in renamed:
+        change_hub.publish(project_id, version, "user.renamed", {"user_id": user.id, "name": user.name})
     db.refresh(user)
     user_dict = {
         "id": user.id,
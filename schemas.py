@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional, Union
+from typing_extensions import Annotated
 from datetime import datetime
+from enum import Enum
 
 class TaskBase(BaseModel):
     name: str
@@ -49,6 +51,20 @@ class TagCreate(BaseModel):
     name: str
     color: str
 
+class GeneratedTag(BaseModel):
+    name: str = Field(max_length=50)
+    color: str = Field(max_length=50)
+
+class GeneratedTask(BaseModel):
+    name: str = Field(max_length=100)
+    description: Optional[str] = None
+    finished: bool = False
+    date: datetime
+    tag: Optional[GeneratedTag] = None
+
+class GeneratedPlan(BaseModel):
+    tasks: List[GeneratedTask] = Field(min_length=1)
+
 class ProjectBase(BaseModel):
     name: str
     description: Optional[str] = None
@@ -137,4 +153,215 @@ class EmailSchema(BaseModel):
     subject: str
     message: str
     sender: str
-    receiver: str
\ No newline at end of file
+    receiver: str
+
+class EntityRef(BaseModel):
+    id: str
+    name: Optional[str] = None
+
+class TagOut(BaseModel):
+    id: str
+    name: str
+    color: str
+    project_id: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class TaskTagOut(BaseModel):
+    id: str
+    name: str
+    color: str
+
+class TaskOut(BaseModel):
+    id: str
+    project_id: Optional[str] = None
+    name: str
+    description: Optional[str] = None
+    date: Optional[datetime] = None
+    finished: Optional[bool] = None
+    assignees: List[EntityRef] = Field(default_factory=list)
+    tag: Optional[TaskTagOut] = None
+
+class TaskRecord(BaseModel):
+    id: str
+    name: str
+    description: Optional[str] = None
+    finished: Optional[bool] = None
+    date: Optional[datetime] = None
+    project_id: Optional[str] = None
+    tag_id: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class ProjectOut(BaseModel):
+    id: str
+    name: str
+    description: Optional[str] = None
+    finished: Optional[bool] = None
+    priority: Optional[str] = None
+    date_start: Optional[datetime] = None
+    date_end: Optional[datetime] = None
+    tasks: List[TaskOut] = Field(default_factory=list)
+    owner: Optional[EntityRef] = None
+    assignees: List[EntityRef] = Field(default_factory=list)
+    tags: List[TagOut] = Field(default_factory=list)
+
+class ProjectRecord(BaseModel):
+    id: str
+    name: str
+    description: Optional[str] = None
+    finished: Optional[bool] = None
+    priority: Optional[str] = None
+    date_start: Optional[datetime] = None
+    date_end: Optional[datetime] = None
+    owner_id: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class ResponseMode(str, Enum):
+    full = "full"
+    minimal = "minimal"
+
+class TaskDelta(BaseModel):
+    id: str
+    project_id: Optional[str] = None
+    version: Optional[int] = None
+    changes: Dict[str, Any] = Field(default_factory=dict)
+
+class DeletedTask(BaseModel):
+    id: str
+    project_id: Optional[str] = None
+    version: Optional[int] = None
+
+class BulkCreateTask(BaseModel):
+    op: Literal["create"]
+    name: str
+    description: Optional[str] = None
+    date: Optional[datetime] = None
+    finished: bool = False
+    tag_id: Optional[str] = None
+    assignee_ids: Optional[List[str]] = None
+
+class BulkUpdateTask(BaseModel):
+    op: Literal["update"]
+    task_id: str
+    name: Optional[str] = None
+    description: Optional[str] = None
+    date: Optional[datetime] = None
+    finished: Optional[bool] = None
+    tag_id: Optional[str] = None
+
+    @validator("name", "finished")
+    def reject_null(cls, value):
+        # Omit a field to leave it unchanged; null would be written as-is.
+        if value is None:
+            raise ValueError("cannot be null")
+        return value
+
+class BulkFinishTask(BaseModel):
+    op: Literal["finish"]
+    task_id: str
+    finished: bool = True
+
+class BulkRetagTask(BaseModel):
+    op: Literal["retag"]
+    task_id: str
+    tag_id: Optional[str] = None
+
+class BulkAssignTask(BaseModel):
+    op: Literal["assign"]
+    task_id: str
+    user_ids: List[str]
+
+class BulkDeleteTask(BaseModel):
+    op: Literal["delete"]
+    task_id: str
+
+BulkTaskOperation = Annotated[
+    Union[BulkCreateTask, BulkUpdateTask, BulkFinishTask, BulkRetagTask, BulkAssignTask, BulkDeleteTask],
+    Field(discriminator="op")
+]
+
+class BulkTaskRequest(BaseModel):
+    operations: List[BulkTaskOperation]
+
+class BulkTaskResult(BaseModel):
+    index: int
+    op: str
+    task_id: Optional[str] = None
+    status: str
+    detail: Optional[str] = None
+
+class BulkTaskResponse(BaseModel):
+    project_id: str
+    version: Optional[int] = None
+    results: List[BulkTaskResult]
+
+class TagCount(BaseModel):
+    id: str
+    name: Optional[str] = None
+    color: Optional[str] = None
+    task_count: int
+
+class ProjectSummary(BaseModel):
+    id: str
+    name: str
+    priority: Optional[str] = None
+    finished: Optional[bool] = None
+    date_start: Optional[datetime] = None
+    date_end: Optional[datetime] = None
+    version: Optional[int] = None
+    total_tasks: int = 0
+    finished_tasks: int = 0
+    progress: float = 0.0
+    next_due_date: Optional[datetime] = None
+    tags: List[TagCount] = Field(default_factory=list)
+
+class CalendarTask(BaseModel):
+    id: str
+    name: str
+    description: Optional[str] = None
+    date: Optional[datetime] = None
+    finished: Optional[bool] = None
+    project_id: Optional[str] = None
+    project_name: Optional[str] = None
+    tag: Optional[TaskTagOut] = None
+
+class ProjectPage(BaseModel):
+    items: List[ProjectOut]
+    next_cursor: Optional[str] = None
+
+class TaskPage(BaseModel):
+    items: List[TaskOut]
+    next_cursor: Optional[str] = None
+
+class TaskRecordPage(BaseModel):
+    items: List[TaskRecord]
+    next_cursor: Optional[str] = None
+
+class UserDirectoryEntry(BaseModel):
+    id: str
+    name: Optional[str] = None
+    email: Optional[str] = None
+    gender: Optional[str] = None
+    DOB: Optional[datetime] = None
+    picture: Optional[str] = None
+    projects: Optional[List[EntityRef]] = None
+    tasks: Optional[List[EntityRef]] = None
+
+class UserDirectoryPage(BaseModel):
+    items: List[UserDirectoryEntry]
+    next_cursor: Optional[str] = None
+
+class UserDetails(BaseModel):
+    id: str
+    name: str
+    email: str
+    gender: Optional[str] = ""
+    DOB: Optional[datetime] = None
+    picture: Optional[str] = ""
+    projects: List[EntityRef] = Field(default_factory=list)
+    tasks: List[EntityRef] = Field(default_factory=list)
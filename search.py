@@ -0,0 +1,78 @@
+import os
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Union
+from sqlalchemy import column, exists, func, literal, literal_column, or_, table
+from sqlalchemy.orm import Session
+from models import Task, user_tasks
+from crud import load_tasks, serialize_task, task_tree_query
+from pagination import PageParams, paginate
+
+SEARCH_MAX_TERMS = int(os.getenv("SEARCH_MAX_TERMS", "8"))
+
+# The text-search configuration used by the tsvector column in migration 0006.
+SEARCH_CONFIG = "english"
+
+tasks_fts = table("tasks_fts", column("rowid"))
+
+
+def search_terms(q: str):
+    """Split free text into word tokens; operators and quotes are not passed through."""
+    return re.findall(r"\w+", q or "")[:SEARCH_MAX_TERMS]
+
+
+def match_terms(query, terms, dialect: str):
+    """Restrict a query over tasks to rows matching every term as a prefix.
+
+    Returns the query and a rank expression where lower is a better match.
+    """
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery(SEARCH_CONFIG, " & ".join(f"{term}:*" for term in terms))
+        vector = literal_column("tasks.search_vector")
+        return query.filter(vector.op("@@")(tsquery)), (-func.ts_rank_cd(vector, tsquery)).label("rank")
+    if dialect == "sqlite":
+        fts_query = " ".join('"%s"*' % term for term in terms)
+        query = query.join(tasks_fts, tasks_fts.c.rowid == literal_column("tasks.rowid"))
+        return query.filter(literal_column("tasks_fts").op("MATCH")(fts_query)), func.bm25(literal_column("tasks_fts")).label("rank")
+    # No text index on this backend: scan, unranked.
+    for term in terms:
+        pattern = f"%{term}%"
+        query = query.filter(or_(Task.name.ilike(pattern), Task.description.ilike(pattern)))
+    return query, literal(0.0).label("rank")
+
+
+def search_tasks(db: Session, project_id: str, page: PageParams, q: str = None, tag_id: str = None, finished: bool = None,
+                 date_from: datetime = None, date_to: Union[date, datetime] = None, assignee_id: str = None):
+    """One page of a project's tasks matching `q` and the filters.
+
+    With search terms, results are ordered by relevance; otherwise by date,
+    like /get_tasks. A `date_to` given as a date includes that whole day.
+    Returns serialized tasks and the next cursor.
+    """
+    criteria = [Task.project_id == project_id]
+    if tag_id is not None:
+        criteria.append(Task.tag_id == tag_id)
+    if finished is not None:
+        criteria.append(Task.finished == finished)
+    if date_from is not None:
+        criteria.append(Task.date >= date_from)
+    if isinstance(date_to, datetime):
+        criteria.append(Task.date <= date_to)
+    elif date_to is not None:
+        criteria.append(Task.date < datetime.combine(date_to + timedelta(days=1), time.min))
+    if assignee_id is not None:
+        criteria.append(exists().where(user_tasks.c.user_id == assignee_id, user_tasks.c.task_id == Task.id))
+
+    terms = search_terms(q)
+    if not terms:
+        tasks, next_cursor = paginate(task_tree_query(db, *criteria), Task.date, Task.id, page)
+        return [serialize_task(task) for task in tasks], next_cursor
+
+    # The rank is computed per matching row and cannot come from an index, so
+    # every page ranks and sorts the whole match set; the keyset cursor only
+    # bounds how many rows are returned and loaded.
+    query, rank = match_terms(db.query(Task.id), terms, db.get_bind().dialect.name)
+    rows, next_cursor = paginate(query.add_columns(rank).filter(*criteria), rank, Task.id, page)
+    ids = [row.id for row in rows]
+    tasks = {task.id: task for task in load_tasks(db, Task.id.in_(ids))} if ids else {}
+    return [serialize_task(tasks[task_id]) for task_id in ids if task_id in tasks], next_cursor
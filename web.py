@@ -0,0 +1,46 @@
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from database import engine, replica_engine
+from instrumentation import InstrumentationMiddleware, TimedORJSONResponse, instrument_engine, metrics_routes
+from routes.users import users_routes
+from routes.projects import projects_routes
+from routes.tasks import tasks_routes
+from outbox import email_sender
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Deliver mail left pending by containers that scaled down or crashed,
+    # without waiting for someone to queue a new email.
+    email_sender.start()
+    yield
+
+
+def create_app():
+    instrument_engine(engine)
+    if replica_engine is not None:
+        instrument_engine(replica_engine)
+
+    web_app = FastAPI(default_response_class=TimedORJSONResponse, lifespan=lifespan)
+
+    origins = ["*"]
+
+    web_app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["Server-Timing", "ETag"],
+    )
+    web_app.add_middleware(InstrumentationMiddleware)
+
+    web_app.include_router(users_routes)
+    web_app.include_router(projects_routes)
+    web_app.include_router(tasks_routes)
+    web_app.include_router(metrics_routes)
+    return web_app
+
+
+web_app = create_app()